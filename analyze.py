@@ -15,19 +15,48 @@
 
 """ROS 2 system example analysis script, see README."""
 
-import itertools
+import argparse
+from array import array
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+import contextlib
+import cProfile
+import glob
+import hashlib
+import inspect
+import json
+import math
 import os
+import pickle
+import resource
 import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import NamedTuple
 from typing import Optional
+from typing import Set
 from typing import Tuple
-
-import matplotlib.pyplot as plt
+from typing import TYPE_CHECKING
+from typing import Union
 
 import numpy as np
 
 import pandas as pd
 
+# Plotting and trace reading modules take a while to import and are not always needed,
+# e.g., for cached traces in metrics-only mode, so they are imported when needed
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+
 # Add paths to tracetools_analysis and tracetools_read, assuming a workspace with:
 #   src/tracetools_analysis/
 #   src/ros-tracing/ros2_tracing/tracetools_read/
@@ -35,7 +64,7 @@ src_dir = 'analysis_ws/src'
 sys.path.insert(0, os.path.join(src_dir, 'tracetools_analysis/tracetools_analysis'))
 sys.path.insert(0, os.path.join(src_dir, 'ros-tracing/ros2_tracing/tracetools_read'))
 
-from tracetools_analysis.loading import load_file  # noqa: E402
+from tracetools_analysis.data_model.ros2 import Ros2DataModel  # noqa: E402
 from tracetools_analysis.processor.ros2 import Ros2Handler  # noqa: E402
 from tracetools_analysis.utils.ros2 import Ros2DataModelUtil  # noqa: E402
 
@@ -43,38 +72,538 @@ from tracetools_analysis.utils.ros2 import Ros2DataModelUtil  # noqa: E402
 # Parameters
 to_svg = True
 include_plot_title = False
+# Bump when the cached tables change
+cache_version = 3
+cache_dir_name = 'analysis_cache'
+# Thread states in kernel analysis
+thread_running = 0
+thread_preempted = 1
+thread_blocked = 2
+thread_wakeup = 3
+# Topics created by default for every node
+ignored_topic_names = {'/rosout', '/parameter_events'}
+# Events that define objects, as opposed to events that are emitted during execution
+definition_event_names = {
+    'ros2:rcl_init',
+    'ros2:rcl_node_init',
+    'ros2:rmw_publisher_init',
+    'ros2:rcl_publisher_init',
+    'ros2:rmw_subscription_init',
+    'ros2:rcl_subscription_init',
+    'ros2:rclcpp_subscription_init',
+    'ros2:rclcpp_subscription_callback_added',
+    'ros2:rcl_service_init',
+    'ros2:rclcpp_service_callback_added',
+    'ros2:rcl_client_init',
+    'ros2:rcl_timer_init',
+    'ros2:rclcpp_timer_callback_added',
+    'ros2:rclcpp_timer_link_node',
+    'ros2:rclcpp_callback_register',
+    'ros2:rcl_lifecycle_state_machine_init',
+}
+# Fields with the callback object or publisher handle of runtime events, for filtering by handle
+handle_field_names = {
+    'ros2:callback_start': 'callback',
+    'ros2:callback_end': 'callback',
+    'ros2:rclcpp_intra_publish': 'publisher_handle',
+    'ros2:rcl_publish': 'publisher_handle',
+}
+
+
+# Process pools shared by all figure exports, by number of processes, created when first needed
+export_executors = {}
+export_executors_lock = threading.Lock()
+CallbackKey = Tuple[Optional[str], Optional[str], str]
+
+
+class TimeRanges:
+    """
+    Time ranges, e.g., callback instances.
+
+    The begin timestamps, end timestamps, and durations are stored as int64 nanosecond arrays.
+    Indexing with a slice, a mask, or an index array gives the corresponding time ranges
+    (without copying for slices), while indexing with an integer gives a (begin, end, duration) tuple.
+    """
+
+    __slots__ = ('begins', 'ends', 'durations')
+
+    def __init__(
+        self,
+        begins: np.ndarray,
+        ends: np.ndarray,
+        durations: np.ndarray,
+    ) -> None:
+        """Create time ranges from begin timestamps, end timestamps, and durations (ns)."""
+        self.begins = np.asarray(begins, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.durations = np.asarray(durations, dtype=np.int64)
+
+    @staticmethod
+    def from_begins_durations(begins: np.ndarray, durations: np.ndarray) -> 'TimeRanges':
+        """Create time ranges from begin timestamps and durations (ns)."""
+        begins = np.asarray(begins, dtype=np.int64)
+        durations = np.asarray(durations, dtype=np.int64)
+        return TimeRanges(begins, begins + durations, durations)
+
+    def __len__(self) -> int:
+        return len(self.begins)
+
+    def __getitem__(self, key) -> Union['TimeRanges', Tuple[int, int, int]]:
+        if isinstance(key, (int, np.integer)):
+            return int(self.begins[key]), int(self.ends[key]), int(self.durations[key])
+        return TimeRanges(self.begins[key], self.ends[key], self.durations[key])
+
+    def intervals(self) -> np.ndarray:
+        """Get intervals (ns) between consecutive begin timestamps."""
+        return np.diff(self.begins)
+
+    def to_relative_ms(self, start: int, time_offset: float = 0.0) -> np.ndarray:
+        """
+        Get ranges in ms relative to a start timestamp.
+
+        :param start: the start timestamp (ns)
+        :param time_offset: the offset (ms) to add to relative begin & end times
+        :return: an (N, 3) array of relative begin times, relative end times, and durations (ms)
+        """
+        return np.column_stack((
+            time_offset + (self.begins - start) / 1e6,
+            time_offset + (self.ends - start) / 1e6,
+            self.durations / 1e6,
+        ))
+
+
+class EventStore:
+    """
+    Events indexed by key (e.g., handle or callback object) and time.
+
+    Events are sorted by key, then chronologically, once. The events of a key are contiguous, so getting them
+    gives views of the sorted arrays, and getting the events of a key in a time range only takes binary searches.
+    Getting the events of all keys in a time range uses a chronological order, computed only once.
+    """
+
+    __slots__ = ('keys', 'timestamps', 'columns', '_bounds', '_order', '_order_timestamps')
+
+    def __init__(self, keys: np.ndarray, timestamps: np.ndarray, **columns: np.ndarray) -> None:
+        """
+        Create event store.
+
+        :param keys: the key of every event
+        :param timestamps: the timestamp (ns) of every event
+        :param columns: other values of every event, by column name
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        order = np.lexsort((timestamps, keys))
+        self.keys = keys[order]
+        self.timestamps = timestamps[order]
+        self.columns = {name: np.asarray(values)[order] for name, values in columns.items()}
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(self.keys)) + 1, [len(order)]))
+        self._bounds = {
+            int(self.keys[begin]): (int(begin), int(end))
+            for begin, end in zip(bounds[:-1], bounds[1:])
+            if begin < end
+        }
+        self._order = None
+        self._order_timestamps = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._bounds
+
+    def get_keys(self) -> List[int]:
+        """Get keys, in increasing order."""
+        return list(self._bounds)
+
+    def get_slice(self, key: int, start: Optional[int] = None, end: Optional[int] = None) -> slice:
+        """
+        Get positions of the events of a key in a time range.
+
+        :param key: the key
+        :param start: the start timestamp (ns), inclusive, or `None` for the first event
+        :param end: the end timestamp (ns), exclusive, or `None` for the last event
+        :return: the positions in the sorted arrays, empty if the key is unknown
+        """
+        begin, stop = self._bounds.get(key, (0, 0))
+        timestamps = self.timestamps[begin:stop]
+        first = begin + np.searchsorted(timestamps, start, side='left') if start is not None else begin
+        last = begin + np.searchsorted(timestamps, end, side='left') if end is not None else stop
+        return slice(int(first), int(max(first, last)))
+
+    def get(
+        self,
+        key: int,
+        column: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Get values of the events of a key in a time range, in chronological order, without copying.
 
+        :param key: the key
+        :param column: the column name, or `None` for the timestamps
+        :param start: the start timestamp (ns), inclusive, or `None` for the first event
+        :param end: the end timestamp (ns), exclusive, or `None` for the last event
+        :return: the values
+        """
+        values = self.timestamps if column is None else self.columns[column]
+        return values[self.get_slice(key, start, end)]
+
+    def get_window(self, start: int, end: int) -> np.ndarray:
+        """
+        Get positions of the events of all keys in a time range.
 
-trace_name = None
-data_util = None
-callback_symbols = None
-TimeRange = Tuple[pd.Timestamp, pd.Timestamp, pd.Timedelta]
-TimeRanges = List[TimeRange]
-
-
-def get_handle(handle_type: str, name: str) -> int:
-    """Get handle from name and type."""
-    if handle_type == 'pub':
-        pub_handles = data_util.data.rcl_publishers.loc[
-            data_util.data.rcl_publishers['topic_name'] == name
-        ].index.values.astype(int)
-        # For this demo, we don't expect more than 1 publisher per topic
-        assert 1 == len(pub_handles)
-        return pub_handles[0]
-    if handle_type == 'sub':
-        sub_handles = data_util.data.rcl_subscriptions.loc[
-            data_util.data.rcl_subscriptions['topic_name'] == name
-        ].index.values.astype(int)
-        # For this demo, we don't expect more than 1 subscription per topic
-        assert 1 == len(sub_handles), f'len={len(sub_handles)}'
-        return sub_handles[0]
-    if handle_type == 'node':
-        node_handles = data_util.data.nodes.loc[
-            data_util.data.nodes['name'] == name
-        ].index.values.astype(int)
-        assert 1 == len(node_handles), f'len={len(node_handles)}'
-        return node_handles[0]
-    assert False, 'unknown handle_type value'
+        :param start: the start timestamp (ns), inclusive
+        :param end: the end timestamp (ns), exclusive
+        :return: the positions in the sorted arrays, in chronological order
+        """
+        if self._order is None:
+            self._order = np.argsort(self.timestamps, kind='stable')
+            self._order_timestamps = self.timestamps[self._order]
+        first = np.searchsorted(self._order_timestamps, start, side='left')
+        last = np.searchsorted(self._order_timestamps, end, side='left')
+        return self._order[first:max(first, last)]
+
+
+class NodeTimings(NamedTuple):
+    """Timings of the subscription callbacks, timer callbacks, and publications of a node."""
+
+    name: str
+    # Subscription callback instance ranges for each topic, in subscription creation order
+    subscriptions: Dict[str, TimeRanges]
+    # Timer callback instance ranges for each callback object
+    timers: Dict[int, TimeRanges]
+    # Publication timestamps (ns) for each topic, in publisher creation order
+    publishers: Dict[str, np.ndarray]
+
+
+class EventFilter(NamedTuple):
+    """Filter of the runtime events of a trace, applied while reading it; definition events are always kept."""
+
+    # Time window (s) relative to the first event of the trace, or `None` for no bound
+    start: Optional[float] = None
+    end: Optional[float] = None
+    # Names of the runtime events to keep, or `None` for all events
+    event_names: Optional[Set[str]] = None
+    # Callback objects and publisher handles of the callback and publish events to keep, or `None` for all
+    handles: Optional[Set[int]] = None
+
+    def includes(self, event, name: str, time: int) -> bool:
+        """
+        Check if a runtime event is kept.
+
+        :param event: the CTF event message
+        :param name: the event name
+        :param time: the event timestamp (ns) relative to the first event of the trace
+        :return: whether the event is kept
+        """
+        if self.event_names is not None and name not in self.event_names:
+            return False
+        if self.start is not None and time < self.start * 1e9:
+            return False
+        if self.end is not None and time > self.end * 1e9:
+            return False
+        if self.handles is not None and name in handle_field_names:
+            return int(event.event.payload_field[handle_field_names[name]]) in self.handles
+        return True
+
+
+class ExportSettings(NamedTuple):
+    """Settings of the plot files written by the analysis."""
+
+    # Formats of the plot files
+    formats: Tuple[str, ...] = ('png', 'svg', 'pdf')
+    # Number of processes used to write the plot files in parallel
+    jobs: int = 1
+
+
+class StageProfiler:
+    """
+    Profiler of analysis stages.
+
+    For every stage, this records the wall time, CPU time, peak RSS of the process at the end of the stage,
+    and number of rows (e.g., events or callback instances) processed, if given.
+    """
+
+    def __init__(self) -> None:
+        """Create profiler without records."""
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[Dict]:
+        """
+        Profile stage.
+
+        :param name: the stage name
+        :return: the record of the stage, in which the number of rows can be set
+        """
+        record = {'stage': name, 'rows': None}
+        wall_time = time.perf_counter()
+        cpu_time = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_time_s'] = time.perf_counter() - wall_time
+            record['cpu_time_s'] = time.process_time() - cpu_time
+            # In kB on Linux
+            record['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+            self.records.append(record)
+
+    def get_summary(self) -> pd.DataFrame:
+        """Get summary, with one row per stage name, in order of first occurrence."""
+        records = pd.DataFrame(
+            self.records, columns=['stage', 'rows', 'wall_time_s', 'cpu_time_s', 'peak_rss_mb'])
+        summary = records.groupby('stage', sort=False).agg(
+            calls=('stage', 'size'),
+            rows=('rows', lambda rows: rows.sum(min_count=1)),
+            wall_time_s=('wall_time_s', 'sum'),
+            cpu_time_s=('cpu_time_s', 'sum'),
+            peak_rss_mb=('peak_rss_mb', 'max'),
+        )
+        summary['rows'] = summary['rows'].astype('Int64')
+        return summary.reset_index()
+
+
+def get_stage(profiler: Optional[StageProfiler], name: str) -> contextlib.AbstractContextManager:
+    """
+    Profile stage if profiling is enabled, see `StageProfiler.stage()`.
+
+    :param profiler: the profiler, or `None` if profiling is disabled
+    :param name: the stage name
+    :return: the context of the stage, with the record in which the number of rows can be set
+    """
+    if profiler is None:
+        return contextlib.nullcontext({})
+    return profiler.stage(name)
+
+
+def get_cache_key(path: str) -> str:
+    """
+    Compute cache key for trace.
+
+    It depends on the size and modification time of the CTF trace files under the given path, on
+    the version of the handler used to process them, and on the version of the cached tables.
+
+    :param path: the path to the trace
+    :return: the cache key
+    """
+    key = hashlib.sha1(f'v{cache_version}'.encode())
+    handler_stat = os.stat(inspect.getsourcefile(Ros2Handler))
+    key.update(f'{handler_stat.st_size}:{handler_stat.st_mtime_ns}'.encode())
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        # Only consider CTF trace directories, i.e., ignore files like the converted trace file
+        if 'metadata' not in files:
+            continue
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            file_stat = os.stat(file_path)
+            key.update(f'{os.path.relpath(file_path, path)}:{file_stat.st_size}:{file_stat.st_mtime_ns}'.encode())
+    return key.hexdigest()
+
+
+def read_cache(cache_dir: str, key: str) -> Optional[Ros2DataModel]:
+    """
+    Read processed data from cache.
+
+    Columns are memory-mapped, except for columns of Python objects, so tables are not read into memory
+    until they are used.
+
+    :param cache_dir: the cache directory
+    :param key: the expected cache key
+    :return: the data model, or `None` if there is no valid cache
+    """
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    if key != meta['key']:
+        return None
+    data = Ros2DataModel()
+    for table_name, table in meta['tables'].items():
+        columns = {}
+        for i, column_name in enumerate(table['columns']):
+            column_path = os.path.join(cache_dir, table_name, f'{i}.npy')
+            if column_name in table['objects']:
+                columns[column_name] = np.load(column_path, allow_pickle=True)
+            else:
+                columns[column_name] = np.load(column_path, mmap_mode='r')
+        df = pd.DataFrame(columns, copy=False)
+        if table['index'] is not None:
+            df.set_index(df.columns[:len(table['index'])].tolist(), inplace=True)
+            df.index.names = table['index']
+        setattr(data, table_name, df)
+    return data
+
+
+def replace_file(path: str, write) -> None:
+    """
+    Write a file by writing a temporary file and then replacing the file with it.
+
+    The file is never truncated, since other processes may have memory-mapped it, and accessing the mapping
+    of a truncated file crashes them; they keep the previous contents instead.
+
+    :param path: the path of the file
+    :param write: the function that writes the contents to a given file object
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def write_cache(cache_dir: str, key: str, data: Ros2DataModel) -> None:
+    """
+    Write processed data to cache.
+
+    Every column of the dataframes of the data model is written to `<table name>/<column number>.npy`,
+    and `meta.json` has the column names, index names, and cache key of every table. Other processes can
+    then memory-map the columns with `numpy.load(path, mmap_mode='r')`. Columns of strings are written
+    as fixed-length strings, and other columns of Python objects are pickled.
+
+    Existing files are replaced instead of being overwritten, see `replace_file()`, and `meta.json` is removed
+    first, so that the cache is invalid until it is complete.
+
+    :param cache_dir: the cache directory
+    :param key: the cache key
+    :param data: the data model
+    """
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(meta_path)
+    tables = {}
+    for table_name, df in vars(data).items():
+        if not isinstance(df, pd.DataFrame):
+            continue
+        if df.index.equals(pd.RangeIndex(len(df))) and df.index.name is None:
+            index_names = None
+            df = df.reset_index(drop=True)
+        else:
+            index_names = list(df.index.names)
+            df = df.reset_index()
+        os.makedirs(os.path.join(cache_dir, table_name), exist_ok=True)
+        objects = []
+        for i, column_name in enumerate(df.columns):
+            values = df[column_name].to_numpy()
+            if values.dtype.hasobject:
+                # Empty columns stay object columns
+                if len(values) and all(isinstance(value, str) for value in values):
+                    values = values.astype(str)
+                else:
+                    objects.append(column_name)
+            replace_file(
+                os.path.join(cache_dir, table_name, f'{i}.npy'),
+                lambda f: np.save(f, values, allow_pickle=column_name in objects))
+        tables[table_name] = {'index': index_names, 'columns': list(df.columns), 'objects': objects}
+    # Write metadata last so that an incomplete cache is never used
+    meta = json.dumps({'key': key, 'tables': tables})
+    replace_file(meta_path, lambda f: f.write(meta.encode()))
+
+
+def load_data_model(
+    trace_dir: str,
+    use_cache: bool = True,
+    event_filter: Optional[EventFilter] = None,
+    profiler: Optional[StageProfiler] = None,
+) -> Ros2DataModel:
+    """
+    Load and process trace data, or get it from the cache.
+
+    :param trace_dir: the path to the directory containing the trace
+    :param use_cache: whether to read from and write to the cache
+    :param event_filter: the filter applied while reading the trace, in which case the cache is not used,
+        or `None` to process all events
+    :param profiler: the profiler of the loading stages, or `None`
+    :return: the data model
+    """
+    path = f'{trace_dir}/ust'
+    if event_filter is not None:
+        # Only complete data is cached
+        use_cache = False
+    cache_dir = os.path.join(trace_dir, cache_dir_name)
+    key = None
+    if use_cache:
+        with get_stage(profiler, 'read_cache'):
+            key = get_cache_key(path)
+            data = read_cache(cache_dir, key)
+        if data is not None:
+            print(f'Using cached data: {cache_dir}')
+            return data
+    if event_filter is None:
+        from tracetools_analysis.loading import load_file
+        with get_stage(profiler, 'load_file') as stage:
+            events = load_file(path)
+            stage['rows'] = len(events)
+    else:
+        with get_stage(profiler, 'read_events') as stage:
+            events = list(read_events(path, event_filter=event_filter))
+            stage['rows'] = len(events)
+    with get_stage(profiler, 'Ros2Handler.process') as stage:
+        handler = Ros2Handler.process(events)
+        stage['rows'] = len(events)
+    with get_stage(profiler, 'add_callback_instance_tids') as stage:
+        add_callback_instance_tids(handler.data, events)
+        stage['rows'] = len(handler.data.callback_instances)
+    if use_cache:
+        with get_stage(profiler, 'write_cache'):
+            write_cache(cache_dir, key, handler.data)
+    return handler.data
+
+
+def add_callback_instance_tids(data: Ros2DataModel, events: List[Dict]) -> None:
+    """
+    Add the TID of the thread that executed each callback instance to the callback instances table.
+
+    :param data: the data model
+    :param events: the events used to create the data model
+    """
+    callback_starts = pd.DataFrame(
+        [
+            (event['callback'], event['_timestamp'], event['vtid'])
+            for event in events
+            if 'ros2:callback_start' == event['_name']
+        ],
+        columns=['callback_object', 'timestamp', 'tid'],
+    ).drop_duplicates(['callback_object', 'timestamp'])
+    data.callback_instances = data.callback_instances.merge(
+        callback_starts, on=['callback_object', 'timestamp'], how='left')
+
+
+def read_events(
+    path: str,
+    event_names: Optional[Set[str]] = None,
+    event_filter: Optional[EventFilter] = None,
+) -> Iterator[Dict]:
+    """
+    Read events from a CTF trace one at a time.
+
+    :param path: the path to the CTF trace
+    :param event_names: the names of the events to read, or `None` for all events;
+        other events are skipped without being converted to dicts
+    :param event_filter: the filter of runtime events, or `None` to read all events;
+        other events are also skipped without being converted to dicts
+    :return: the events, as dicts
+    """
+    from tracetools_read.trace import event_to_dict
+    from tracetools_read.trace import get_trace_ctf_events
+    origin = None
+    for event in get_trace_ctf_events(path):
+        name = event.event.name
+        if event_names is not None and name not in event_names:
+            continue
+        if event_filter is not None:
+            timestamp = event.default_clock_snapshot.ns_from_origin
+            if origin is None:
+                origin = timestamp
+            if name not in definition_event_names and not event_filter.includes(event, name, timestamp - origin):
+                continue
+        yield event_to_dict(event)
 
 
 # def get_pub_sub_creation_time(handle_type: str, topic_name: str) -> pd.Timestamp:
@@ -109,137 +638,405 @@ def get_handle(handle_type: str, name: str) -> int:
 #     return df.loc[timer_handle, 'timestamp']
 
 
-def get_timer_callback_ranges(timer_node_name: str) -> TimeRanges:
-    """Get timer callback instance ranges."""
-    # Get timer object
-    objs_and_owners = {
-        obj: data_util.get_callback_owner_info(obj)
-        for obj, _ in callback_symbols.items()
-    }
-    timer_objs = [
-        obj for obj, owner_info in objs_and_owners.items()
-        if timer_node_name in owner_info and 'Timer' in owner_info
-    ]
-    assert 1 == len(timer_objs), f'len={len(timer_objs)}'
-    timer_obj = timer_objs[0]
-    print(f"Timer for node '{timer_node_name}': 0x{timer_obj:x}")
-
-    # Get callback durations
-    callback_durations = data_util.get_callback_durations(timer_obj)
-
-    # Convert to simple list of tuples
-    ranges = []
-    for _, row in callback_durations.iterrows():
-        begin = row['timestamp']
-        duration = row['duration']
-        ranges.append((begin, begin + duration, duration))
-    return ranges
-
-
-def get_sub_callback_ranges(
-    sub_topic_name: str,
-    node_name: Optional[str] = None,
-) -> TimeRanges:
-    """Get subscription callback instance ranges."""
-    # Get callback object
-    objs_and_owners = {
-        obj: data_util.get_callback_owner_info(obj)
-        for obj, _ in callback_symbols.items()
-    }
-    sub_objs = [
-        obj for obj, owner_info in objs_and_owners.items()
-        if sub_topic_name in owner_info
-        and (node_name in owner_info if node_name is not None else True)
-    ]
-    assert 1 == len(sub_objs), f'len={len(sub_objs)}'
-    sub_obj = sub_objs[0]
-
-    # Get callback durations
-    callback_durations = data_util.get_callback_durations(sub_obj)
-
-    # Convert to simple list of tuples
-    ranges = []
-    for _, row in callback_durations.iterrows():
-        begin = row['timestamp']
-        duration = row['duration']
-        ranges.append((begin, begin + duration, duration))
-    return ranges
-
-
-def get_sub_callback_times(
-    sub_topic_name: str,
-    node_name: Optional[str] = None,
-) -> List[pd.Timestamp]:
-    """Get subscription callback timestamps for topic and node."""
-    ranges = get_sub_callback_ranges(sub_topic_name, node_name)
-    return [r[0] for r in ranges]
-
-
-def get_publish_times(pub_topic_name: str) -> List[pd.Timestamp]:
-    """Get publication timestamps for topic."""
-    # Get all publish instances
-    pub_instances = data_util.get_publish_instances()
-
-    # Get publisher handle
-    pub_handle = get_handle('pub', pub_topic_name)
-
-    # Since publish calls go rclcpp->rcl->rmw and since we
-    # only know the publisher handle at the rcl level, we first
-    # get the indexes of all rcl_publish calls for our publisher
-    rcl_pub_indexes = pub_instances.loc[
-        pub_instances['publisher_handle'] == pub_handle
-    ].index.values.astype(int)
-    rcl_pub_indexes = list(rcl_pub_indexes)
-    max_index = pub_instances.index.values.astype(int).max()
-    # Then we group rclcpp & rmw calls (before & after,
-    # respectively) with matching message pointers
-    rclcpp_rmw_pub_timestamps = []
-    for rcl_pub_index in rcl_pub_indexes:
-        # Get message pointer value
-        message = pub_instances.iloc[rcl_pub_index]['message']
-        # Get corresponding rclcpp_publish row
-        rclcpp_timestamp = None
-        rclcpp_pub_index = rcl_pub_index - 1
-        while rclcpp_pub_index >= 0:
-            # Find the first row above with the same message
-            row = pub_instances.iloc[rclcpp_pub_index]
-            if message == row['message'] and 'rclcpp' == row['layer']:
-                rclcpp_timestamp = row['timestamp']
-                break
-            rclcpp_pub_index -= 1
-        # Get corresponding rmw_publish row
-        rmw_timestamp = None
-        rmw_pub_index = rcl_pub_index + 1
-        while rmw_pub_index <= max_index:
-            # Find the first row below rcl_publish row with the same message
-            row = pub_instances.iloc[rmw_pub_index]
-            if message == row['message'] and 'rmw' == row['layer']:
-                rmw_timestamp = row['timestamp']
-                break
-            rmw_pub_index += 1
-
-        assert rclcpp_timestamp is not None and rmw_timestamp is not None
-        rclcpp_rmw_pub_timestamps.append(rclcpp_timestamp + (rmw_timestamp - rclcpp_timestamp) / 2)
-
-    return rclcpp_rmw_pub_timestamps
-
-
-def get_intervals(ranges: TimeRanges) -> Tuple[List[float], List[float]]:
-    """Compute time intervals between ranges."""
-    times = []
-    periods = []
-    starttime = ranges[0][0]
-    endtime = ranges[-1][1]
-    for i in range(1, len(ranges)):
-        times.append(
-            float(pd.Timedelta.to_numpy(ranges[i][0] - starttime) / np.timedelta64(1, 's')))
-        periods.append(
-            float(
-                pd.Timedelta.to_numpy(ranges[i][0] - ranges[i - 1][0]) / np.timedelta64(1, 'ms')))
-
-    highest_interval_index = max(range(len(periods)), key=periods.__getitem__)
+def get_node_name(name: str, namespace: str) -> str:
+    """Get fully-qualified node name."""
+    return f"{namespace.rstrip('/')}/{name}"
+
+
+def match_publish_instances(
+    rclcpp_instances: pd.DataFrame,
+    rcl_instances: pd.DataFrame,
+    rmw_instances: pd.DataFrame,
+) -> EventStore:
+    """
+    Match rclcpp, rcl, and rmw publish instances and compute publication timestamps.
+
+    Since publish calls go rclcpp->rcl->rmw and since we only know the publisher handle
+    at the rcl level, each rcl_publish instance is grouped with the closest rclcpp_publish
+    instance before it and the closest rmw_publish instance after it with the same message
+    pointer. All instances are sorted by (message, time) once so that this is done for all
+    publishers in a single pass.
+
+    :param rclcpp_instances: the rclcpp_publish instances, with timestamp & message columns
+    :param rcl_instances: the rcl_publish instances, with timestamp, message & publisher_handle columns
+    :param rmw_instances: the rmw_publish instances, with timestamp & message columns
+    :return: the publication timestamps (ns) indexed by publisher handle,
+        using the midpoint between the rclcpp and rmw timestamps
+    """
+    num_rclcpp = len(rclcpp_instances)
+    num_rcl = len(rcl_instances)
+    num_rmw = len(rmw_instances)
+    timestamps = np.concatenate([
+        rclcpp_instances['timestamp'].to_numpy(dtype=np.int64),
+        rcl_instances['timestamp'].to_numpy(dtype=np.int64),
+        rmw_instances['timestamp'].to_numpy(dtype=np.int64),
+    ])
+    messages = np.concatenate([
+        rclcpp_instances['message'].to_numpy(dtype=np.uint64),
+        rcl_instances['message'].to_numpy(dtype=np.uint64),
+        rmw_instances['message'].to_numpy(dtype=np.uint64),
+    ])
+    # Layer codes also break timestamp ties in call order: rclcpp < rcl < rmw
+    layers = np.repeat(np.array([0, 1, 2], dtype=np.int8), [num_rclcpp, num_rcl, num_rmw])
+    handles = np.concatenate([
+        np.zeros(num_rclcpp, dtype=np.uint64),
+        rcl_instances['publisher_handle'].to_numpy(dtype=np.uint64),
+        np.zeros(num_rmw, dtype=np.uint64),
+    ])
+    if 0 == num_rcl:
+        return EventStore([], [])
+
+    # Sort by message pointer, then chronologically
+    order = np.lexsort((layers, timestamps, messages))
+    timestamps = timestamps[order]
+    messages = messages[order]
+    layers = layers[order]
+    handles = handles[order]
+
+    # For every row, find the closest rclcpp row at or above and the closest rmw row at or below
+    positions = np.arange(len(order))
+    prev_rclcpp = np.maximum.accumulate(np.where(0 == layers, positions, -1))
+    next_rmw = np.minimum.accumulate(np.where(2 == layers, positions, len(order))[::-1])[::-1]
+    rcl_indexes = np.flatnonzero(1 == layers)
+    rclcpp_indexes = prev_rclcpp[rcl_indexes]
+    rmw_indexes = next_rmw[rcl_indexes]
+    # Only rows with the same message pointer are valid matches, which all rcl rows have unless the trace
+    # was cropped, in which case rows at the bounds may not have matches
+    valid = (rclcpp_indexes >= 0) & (rmw_indexes < len(order))
+    rcl_indexes = rcl_indexes[valid]
+    rclcpp_indexes = rclcpp_indexes[valid]
+    rmw_indexes = rmw_indexes[valid]
+    valid = (messages[rclcpp_indexes] == messages[rcl_indexes]) & (messages[rmw_indexes] == messages[rcl_indexes])
+    rcl_indexes = rcl_indexes[valid]
+    rclcpp_indexes = rclcpp_indexes[valid]
+    rmw_indexes = rmw_indexes[valid]
+    rclcpp_timestamps = timestamps[rclcpp_indexes]
+    rmw_timestamps = timestamps[rmw_indexes]
+    midpoints = rclcpp_timestamps + (rmw_timestamps - rclcpp_timestamps) // 2
+    return EventStore(handles[rcl_indexes], midpoints)
+
+
+class TraceSession:
+    """
+    Analysis session of a trace.
+
+    A session holds the data model of a trace and the indexes and results computed from it, which are only
+    computed once, when first needed, so that many queries on the same trace are cheap. Sessions do not share
+    any state, and the lazily-computed indexes and results are guarded by a lock, so sessions can be used from
+    multiple threads and many sessions can be used side by side in the same process.
+    """
+
+    def __init__(self, trace_dir: str, data: Ros2DataModel, profiler: Optional[StageProfiler] = None) -> None:
+        """
+        Create session.
+
+        :param trace_dir: the path to the directory containing the trace, under which results are written
+        :param data: the processed data model of the trace
+        :param profiler: the profiler of the analysis stages of the session, or `None`
+        """
+        self.trace_dir = trace_dir
+        self.profiler = profiler
+        self.data_util = Ros2DataModelUtil(data)
+        with get_stage(profiler, 'get_callback_symbols') as stage:
+            self.callback_symbols = self.data_util.get_callback_symbols()
+            stage['rows'] = len(self.callback_symbols)
+        self._lock = threading.Lock()
+        self._callback_index = None
+        self._callback_store = None
+        self._publish_store = None
+
+    @classmethod
+    def load(
+        cls,
+        trace_dir: str,
+        use_cache: bool = True,
+        event_filter: Optional[EventFilter] = None,
+        profiler: Optional[StageProfiler] = None,
+    ) -> 'TraceSession':
+        """
+        Load trace and create session.
+
+        :param trace_dir: the path to the directory containing the trace
+        :param use_cache: whether to use the cache for processed data, see `load_data_model()`
+        :param event_filter: the filter applied while reading the trace, or `None` to process all events
+        :param profiler: the profiler of the loading and analysis stages, or `None`
+        :return: the session
+        """
+        return cls(trace_dir, load_data_model(trace_dir, use_cache, event_filter, profiler), profiler)
+
+    def get_handle(self, handle_type: str, name: str) -> int:
+        """Get handle from name and type."""
+        if handle_type == 'pub':
+            pub_handles = self.data_util.data.rcl_publishers.loc[
+                self.data_util.data.rcl_publishers['topic_name'] == name
+            ].index.values.astype(int)
+            # For this demo, we don't expect more than 1 publisher per topic
+            assert 1 == len(pub_handles)
+            return pub_handles[0]
+        if handle_type == 'sub':
+            sub_handles = self.data_util.data.rcl_subscriptions.loc[
+                self.data_util.data.rcl_subscriptions['topic_name'] == name
+            ].index.values.astype(int)
+            # For this demo, we don't expect more than 1 subscription per topic
+            assert 1 == len(sub_handles), f'len={len(sub_handles)}'
+            return sub_handles[0]
+        if handle_type == 'node':
+            node_handles = self.data_util.data.nodes.loc[
+                self.data_util.data.nodes['name'] == name
+            ].index.values.astype(int)
+            assert 1 == len(node_handles), f'len={len(node_handles)}'
+            return node_handles[0]
+        assert False, 'unknown handle_type value'
+
+    def build_callback_index(self) -> Dict[CallbackKey, List[int]]:
+        """
+        Build index of callback objects by owner.
+
+        Callback objects are indexed by (node name, topic name, callback kind), with fully-qualified
+        node names, `None` as the topic name for timers, and 'timer' or 'subscription' as the kind.
+        They are also indexed with `None` as the node name for lookups by topic name only.
+
+        :return: the callback objects for each (node name, topic name, callback kind)
+        """
+        data = self.data_util.data
+        node_names = self.get_node_names_by_handle()
+        timer_node_handles = data.timer_node_links['node_handle'].to_dict()
+        subscription_handles = data.subscription_objects['subscription_handle'].to_dict()
+        subscription_node_handles = data.rcl_subscriptions['node_handle'].to_dict()
+        subscription_topic_names = data.rcl_subscriptions['topic_name'].to_dict()
+
+        index = defaultdict(list)
+        for reference, callback_object in data.callback_objects['callback_object'].items():
+            if callback_object not in self.callback_symbols:
+                continue
+            if reference in timer_node_handles:
+                kind = 'timer'
+                node_name = node_names.get(timer_node_handles[reference])
+                topic_name = None
+            elif reference in subscription_handles:
+                kind = 'subscription'
+                subscription_handle = subscription_handles[reference]
+                node_name = node_names.get(subscription_node_handles[subscription_handle])
+                topic_name = subscription_topic_names[subscription_handle]
+            else:
+                continue
+            for key in {(node_name, topic_name, kind), (None, topic_name, kind)}:
+                if callback_object not in index[key]:
+                    index[key].append(callback_object)
+        return dict(index)
+
+    def get_callback_index(self) -> Dict[CallbackKey, List[int]]:
+        """Get callback index, building it only once."""
+        with self._lock:
+            if self._callback_index is None:
+                self._callback_index = self.build_callback_index()
+        return self._callback_index
+
+    def get_callback_objects(
+        self,
+        kind: str,
+        node_name: Optional[str] = None,
+        topic_name: Optional[str] = None,
+    ) -> List[int]:
+        """
+        Get callback objects from the callback index.
+
+        :param kind: the callback kind, 'timer' or 'subscription'
+        :param node_name: the node name, with or without leading slash, or `None` for any node
+        :param topic_name: the subscription topic name, or `None` for timers
+        :return: the matching callback objects
+        """
+        if node_name is not None and not node_name.startswith('/'):
+            node_name = '/' + node_name
+        return self.get_callback_index().get((node_name, topic_name, kind), [])
+
+    def get_callback_store(self) -> EventStore:
+        """Get callback instances indexed by callback object, with duration and end columns, indexing them only once."""
+        with self._lock:
+            if self._callback_store is None:
+                callback_instances = self.data_util.data.callback_instances
+                timestamps = callback_instances['timestamp'].to_numpy(dtype=np.int64)
+                durations = callback_instances['duration'].to_numpy(dtype=np.int64)
+                self._callback_store = EventStore(
+                    callback_instances['callback_object'].to_numpy(dtype=np.uint64),
+                    timestamps,
+                    duration=durations,
+                    end=timestamps + durations,
+                )
+        return self._callback_store
+
+    def get_callback_ranges(
+        self,
+        callback_obj: int,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> TimeRanges:
+        """
+        Get callback instance ranges for callback object, without copying.
+
+        :param callback_obj: the callback object
+        :param start: the timestamp (ns) at or after which callback instances begin, or `None`
+        :param end: the timestamp (ns) before which callback instances begin, or `None`
+        :return: the callback instance ranges, in chronological order
+        """
+        store = self.get_callback_store()
+        positions = store.get_slice(callback_obj, start, end)
+        return TimeRanges(
+            store.timestamps[positions],
+            store.columns['end'][positions],
+            store.columns['duration'][positions],
+        )
+
+    def get_timer_callback_ranges(
+        self,
+        timer_node_name: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> TimeRanges:
+        """Get timer callback instance ranges, optionally beginning in the [start, end) time range (ns)."""
+        # Get timer object
+        timer_objs = self.get_callback_objects('timer', timer_node_name)
+        assert 1 == len(timer_objs), f'len={len(timer_objs)}'
+        timer_obj = timer_objs[0]
+        print(f"Timer for node '{timer_node_name}': 0x{timer_obj:x}")
+
+        return self.get_callback_ranges(timer_obj, start, end)
+
+    def get_sub_callback_ranges(
+        self,
+        sub_topic_name: str,
+        node_name: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> TimeRanges:
+        """Get subscription callback instance ranges, optionally beginning in the [start, end) time range (ns)."""
+        # Get callback object
+        sub_objs = self.get_callback_objects('subscription', node_name, sub_topic_name)
+        assert 1 == len(sub_objs), f'len={len(sub_objs)}'
+        sub_obj = sub_objs[0]
+
+        return self.get_callback_ranges(sub_obj, start, end)
+
+    def get_sub_callback_times(
+        self,
+        sub_topic_name: str,
+        node_name: Optional[str] = None,
+    ) -> np.ndarray:
+        """Get subscription callback timestamps (ns) for topic and node."""
+        return self.get_sub_callback_ranges(sub_topic_name, node_name).begins
+
+    def get_publish_store(self) -> EventStore:
+        """Get publication timestamps (ns) indexed by publisher handle, computing them only once."""
+        with self._lock:
+            if self._publish_store is None:
+                self._publish_store = match_publish_instances(
+                    self.data_util.data.rclcpp_publish_instances,
+                    self.data_util.data.rcl_publish_instances,
+                    self.data_util.data.rmw_publish_instances,
+                )
+        return self._publish_store
+
+    def get_publish_times(
+        self,
+        pub_topic_name: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> np.ndarray:
+        """Get publication timestamps (ns) for topic, optionally in the [start, end) time range (ns)."""
+        # Get publisher handle
+        pub_handle = self.get_handle('pub', pub_topic_name)
+
+        return self.get_publish_store().get(int(pub_handle), start=start, end=end)
+
+    def get_node_names_by_handle(self) -> Dict[int, str]:
+        """Get fully-qualified node names by node handle."""
+        nodes = self.data_util.data.nodes
+        return {
+            node_handle: get_node_name(name, namespace)
+            for node_handle, name, namespace in zip(nodes.index, nodes['name'], nodes['namespace'])
+        }
+
+    def get_node_names(self) -> List[str]:
+        """Get fully-qualified names of all nodes."""
+        return sorted(set(self.get_node_names_by_handle().values()))
+
+    def get_node_timings(self, node_names: Optional[List[str]] = None) -> Dict[str, NodeTimings]:
+        """
+        Get timings of nodes.
+
+        The subscriptions, timers, and publishers of the nodes are found from the data model. The callback
+        instance ranges and publication times of all callbacks and publishers are extracted in a single pass,
+        so getting the timings of all nodes costs about as much as getting the timings of one node.
+
+        :param node_names: the node names, with or without leading slash, or `None` for all nodes
+        :return: the timings for each fully-qualified node name
+        """
+        data = self.data_util.data
+        if node_names is None:
+            node_names = self.get_node_names()
+        node_handles = {node_name: node_handle for node_handle, node_name in self.get_node_names_by_handle().items()}
+        subscriptions = data.rcl_subscriptions.sort_values('timestamp')
+        subscriptions = subscriptions.loc[~subscriptions['topic_name'].isin(ignored_topic_names)]
+        publishers = data.rcl_publishers.sort_values('timestamp')
+        publishers = publishers.loc[~publishers['topic_name'].isin(ignored_topic_names)]
+        pub_store = self.get_publish_store()
+
+        timings = {}
+        for node_name in node_names:
+            if not node_name.startswith('/'):
+                node_name = '/' + node_name
+            assert node_name in node_handles, f"unknown node '{node_name}'"
+            node_handle = node_handles[node_name]
+            sub_ranges = {}
+            for topic_name in subscriptions.loc[subscriptions['node_handle'] == node_handle, 'topic_name']:
+                sub_objs = self.get_callback_objects('subscription', node_name, topic_name)
+                if sub_objs:
+                    sub_ranges[topic_name] = self.get_callback_ranges(sub_objs[0])
+            timer_ranges = {
+                timer_obj: self.get_callback_ranges(timer_obj)
+                for timer_obj in self.get_callback_objects('timer', node_name)
+            }
+            node_publishers = publishers.loc[publishers['node_handle'] == node_handle, 'topic_name']
+            pub_times = {
+                topic_name: pub_store.get(int(pub_handle))
+                for pub_handle, topic_name in node_publishers.items()
+            }
+            timings[node_name] = NodeTimings(node_name, sub_ranges, timer_ranges, pub_times)
+        return timings
+
+    def get_object_owners(self) -> pd.DataFrame:
+        """Get the owner node and topic of every callback object and publisher handle."""
+        owners = [
+            (callback_object, kind, node_name, topic_name)
+            for (node_name, topic_name, kind), callback_objects in self.get_callback_index().items()
+            if node_name is not None
+            for callback_object in callback_objects
+        ]
+        data = self.data_util.data
+        node_names = self.get_node_names_by_handle()
+        owners.extend(
+            (pub_handle, 'publisher', node_names.get(node_handle), topic_name)
+            for pub_handle, node_handle, topic_name in zip(
+                data.rcl_publishers.index,
+                data.rcl_publishers['node_handle'],
+                data.rcl_publishers['topic_name'],
+            )
+        )
+        return pd.DataFrame(owners, columns=['object', 'kind', 'node', 'topic'])
+
+
+def get_intervals(ranges: TimeRanges) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute time intervals between ranges, as relative s timestamps and ms intervals."""
+    starttime = ranges.begins[0]
+    endtime = ranges.ends[-1]
+    times = (ranges.begins[1:] - starttime) / 1e9
+    periods = ranges.intervals() / 1e6
+
+    highest_interval_index = int(np.argmax(periods))
     highest_interval_value = periods[highest_interval_index]
-    highest_interval_time = starttime + (np.timedelta64(1, 's') * times[highest_interval_index])
+    highest_interval_time = pd.Timestamp(int(ranges.begins[highest_interval_index + 1]), unit='ns')
+    starttime = pd.Timestamp(int(starttime), unit='ns')
+    endtime = pd.Timestamp(int(endtime), unit='ns')
     print(f'Time intervals between: {starttime} - {endtime}')
     print(
         f'Highest timer callback interval of {highest_interval_value} ms at {highest_interval_time} '
@@ -250,20 +1047,1330 @@ def get_intervals(ranges: TimeRanges) -> Tuple[List[float], List[float]]:
     return times, periods
 
 
-def get_begins_durations(ranges: TimeRanges) -> Tuple[List[float], List[float]]:
-    """Split time ranges into relative begin ms timestamps list and duration list."""
-    times = []
-    durations = []
-    starttime = ranges[0][0]
-    for i in range(len(ranges)):
-        times.append(
-            float(pd.Timedelta.to_numpy(ranges[i][0] - starttime) / np.timedelta64(1, 's')))
-        durations.append(float(pd.Timedelta.to_numpy(ranges[i][2]) / np.timedelta64(1, 'ms')))
+def get_begins_durations(ranges: TimeRanges) -> Tuple[np.ndarray, np.ndarray]:
+    """Split time ranges into relative begin s timestamps and ms durations."""
+    times = (ranges.begins - ranges.begins[0]) / 1e9
+    durations = ranges.durations / 1e6
     return times, durations
 
 
+def get_decimated_indexes(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Get the indexes of the values to keep to plot a series with a maximum number of points.
+
+    The series is split into consecutive buckets, and the minimum and maximum values of every bucket are kept,
+    so that outliers are still visible. All buckets are processed at once with a single sort.
+
+    :param values: the values of the series
+    :param max_points: the maximum number of points
+    :return: the sorted indexes of the values to keep
+    """
+    if len(values) <= max_points:
+        return np.arange(len(values))
+    num_buckets = max(1, max_points // 2)
+    buckets = np.arange(len(values)) * num_buckets // len(values)
+    # Sort by bucket, then by value: the first and last indexes of every bucket are its min and max
+    order = np.lexsort((values, buckets))
+    bounds = np.searchsorted(buckets[order], np.arange(num_buckets + 1))
+    return np.unique(np.concatenate((order[bounds[:-1]], order[bounds[1:] - 1])))
+
+
+def get_percentile_columns(prefix: str, values: np.ndarray, percentiles: Iterable[float]) -> Dict[str, float]:
+    """
+    Get the percentiles and maximum of values (ms) as summary columns.
+
+    :param prefix: the prefix of the column names, e.g., 'duration' for 'duration_p50_ms' and 'duration_max_ms'
+    :param values: the values (ms)
+    :param percentiles: the percentiles to compute
+    :return: the values of the columns, NaN if there are no values
+    """
+    columns = {
+        f'{prefix}_p{percentile:g}_ms': np.percentile(values, percentile) if len(values) else np.nan
+        for percentile in percentiles
+    }
+    columns[f'{prefix}_max_ms'] = values.max() if len(values) else np.nan
+    return columns
+
+
+def get_callback_summary(
+    session: TraceSession,
+    percentiles: Iterable[float] = (50.0, 90.0, 99.0),
+) -> pd.DataFrame:
+    """
+    Summarize the period and duration of every timer and subscription callback.
+
+    :param session: the trace session
+    :param percentiles: the percentiles of the periods and durations to compute
+    :return: the summary, with one row per callback
+    """
+    rows = []
+    for (node_name, topic_name, kind), callback_objects in session.get_callback_index().items():
+        if node_name is None:
+            continue
+        for callback_object in callback_objects:
+            ranges = session.get_callback_ranges(callback_object)
+            row = {
+                'node': node_name,
+                'topic': topic_name,
+                'kind': kind,
+                'callback_object': callback_object,
+                'count': len(ranges),
+            }
+            periods = ranges.intervals() / 1e6
+            durations = ranges.durations / 1e6
+            row.update(get_percentile_columns('period', periods, percentiles))
+            row.update(get_percentile_columns('duration', durations, percentiles))
+            # Worst interval, identified like in get_intervals()
+            row['worst_interval_callback_index'] = int(np.argmax(periods)) + 1 if len(periods) else -1
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch, e.g., for durations (ns).
+
+    Values are counted in buckets with logarithmically-increasing bounds, like DDSketch, so that quantiles
+    have a relative error of at most the given relative accuracy. The buckets cover all positive int64 values,
+    so a sketch has a fixed size regardless of the number of values, and merging sketches only adds up bucket
+    counts. Values below 1 are counted as 1.
+    """
+
+    __slots__ = ('relative_accuracy', 'counts', 'count', 'min', 'max', '_log_gamma')
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        """
+        Create empty sketch.
+
+        :param relative_accuracy: the relative accuracy of quantiles
+        """
+        assert 0.0 < relative_accuracy < 1.0
+        self.relative_accuracy = relative_accuracy
+        self._log_gamma = math.log((1.0 + relative_accuracy) / (1.0 - relative_accuracy))
+        self.counts = np.zeros(int(math.ceil(63 * math.log(2) / self._log_gamma)) + 1, dtype=np.int64)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """Add value."""
+        index = math.ceil(math.log(value) / self._log_gamma) if value > 1 else 0
+        self.counts[min(index, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_values(self, values: np.ndarray) -> None:
+        """Add values."""
+        values = np.asarray(values, dtype=np.float64)
+        if 0 == len(values):
+            return
+        indexes = np.ceil(np.log(np.maximum(values, 1.0)) / self._log_gamma).astype(np.int64)
+        self.counts += np.bincount(np.minimum(indexes, len(self.counts) - 1), minlength=len(self.counts))
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Add values of other sketch."""
+        assert self.relative_accuracy == other.relative_accuracy
+        self.counts += other.counts
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def get_percentile(self, percentile: float) -> float:
+        """Get percentile value, or NaN if the sketch is empty."""
+        if 0 == self.count:
+            return np.nan
+        if percentile >= 100.0:
+            return self.max
+        rank = percentile / 100.0 * (self.count - 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank, side='right'))
+        # Middle of the bucket, relative to its bounds
+        gamma = math.exp(self._log_gamma)
+        value = 2.0 * gamma ** index / (gamma + 1.0)
+        return min(max(value, self.min), self.max)
+
+
+def get_sketch_summary(
+    sketches: Dict[Tuple, QuantileSketch],
+    key_names: List[str],
+    percentiles: Iterable[float] = (50.0, 99.0, 99.9),
+) -> pd.DataFrame:
+    """
+    Summarize sketches of values in ns.
+
+    :param sketches: the sketches, with tuple keys
+    :param key_names: the names of the key columns, one for every key item
+    :param percentiles: the percentiles to compute
+    :return: the summary, with key, count, percentile (ms), and max (ms) columns
+    """
+    rows = []
+    for key, sketch in sketches.items():
+        row = dict(zip(key_names, key))
+        row['count'] = sketch.count
+        for percentile in percentiles:
+            row[f'p{percentile:g}_ms'] = sketch.get_percentile(percentile) / 1e6
+        row['max_ms'] = sketch.max / 1e6 if sketch.count else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows, columns=key_names + ['count'] + [f'p{p:g}_ms' for p in percentiles] + ['max_ms'])
+
+
+def get_callback_sketches(session: TraceSession) -> Dict[Tuple[str, Optional[str], str, str], QuantileSketch]:
+    """Get sketches of the periods and durations of every timer and subscription callback, by owner and metric."""
+    sketches = {}
+    for (node_name, topic_name, kind), callback_objects in session.get_callback_index().items():
+        if node_name is None:
+            continue
+        for callback_object in callback_objects:
+            ranges = session.get_callback_ranges(callback_object)
+            for metric, values in (('period', ranges.intervals()), ('duration', ranges.durations)):
+                sketch = sketches.setdefault((node_name, topic_name, kind, metric), QuantileSketch())
+                sketch.add_values(values)
+    return sketches
+
+
+class Chain(NamedTuple):
+    """Chain of nodes, with the topic published by each node and subscribed to by the next node."""
+
+    nodes: List[str]
+    topics: List[str]
+
+    def __str__(self) -> str:
+        return ' -> '.join(self.topics)
+
+
+def get_chains(session: TraceSession, max_chains: Optional[int] = None) -> List[Chain]:
+    """
+    Get all chains from source nodes to sink nodes in the pub/sub graph.
+
+    Source nodes do not subscribe to any topic (e.g., sensor drivers), and chains end at nodes
+    whose output no other node subscribes to (e.g., actuators). Cycles are ignored.
+
+    :param session: the trace session
+    :param max_chains: the maximum number of chains to get, or `None` for no limit
+    :return: the chains
+    """
+    data = session.data_util.data
+    node_names = session.get_node_names_by_handle()
+    # node -> topics it publishes, and topic -> nodes that subscribe to it
+    published_topics = defaultdict(list)
+    for node_handle, topic_name in zip(data.rcl_publishers['node_handle'], data.rcl_publishers['topic_name']):
+        if topic_name not in ignored_topic_names and node_handle in node_names:
+            published_topics[node_names[node_handle]].append(topic_name)
+    subscriber_nodes = defaultdict(list)
+    subscribing_nodes = set()
+    for node_handle, topic_name in zip(data.rcl_subscriptions['node_handle'], data.rcl_subscriptions['topic_name']):
+        if topic_name not in ignored_topic_names and node_handle in node_names:
+            subscriber_nodes[topic_name].append(node_names[node_handle])
+            subscribing_nodes.add(node_names[node_handle])
+
+    chains = []
+
+    def extend(nodes: List[str], topics: List[str]) -> None:
+        if max_chains is not None and len(chains) >= max_chains:
+            return
+        next_hops = [
+            (topic_name, next_node)
+            for topic_name in published_topics.get(nodes[-1], [])
+            for next_node in subscriber_nodes.get(topic_name, [])
+            # Ignore cycles
+            if next_node not in nodes
+        ]
+        if not next_hops:
+            if topics:
+                chains.append(Chain(nodes, topics))
+            return
+        for topic_name, next_node in next_hops:
+            extend(nodes + [next_node], topics + [topic_name])
+
+    for source_node in sorted(set(published_topics) - subscribing_nodes):
+        extend([source_node], [])
+    return chains
+
+
+def get_next_indexes(sorted_times: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Get the index of the first time at or after every given time.
+
+    :param sorted_times: the sorted times
+    :param times: the times
+    :return: the indexes into the sorted times, or -1 if there is no time at or after the given time
+    """
+    indexes = np.searchsorted(sorted_times, times, side='left')
+    indexes[indexes >= len(sorted_times)] = -1
+    return indexes
+
+
+def get_timer_periods(times: np.ndarray, timer_begins: np.ndarray, pre: bool = True) -> np.ndarray:
+    """
+    Get the timer period that every timestamp falls in.
+
+    With `pre=True`, this gives the timer callback instance that consumes a message received at a given
+    time, i.e., the first timer callback instance that starts at or after that time. With `pre=False`,
+    this gives the timer callback instance that is the last one to start at or before a given time,
+    e.g., the timer callback instance that published a message.
+
+    :param times: the timestamps
+    :param timer_begins: the sorted timer callback instance begin timestamps
+    :param pre: whether to get the next (True) or the previous (False) timer callback instance
+    :return: the index of the timer callback instance for every timestamp, or -1 if there is none
+    """
+    if pre:
+        return get_next_indexes(timer_begins, times)
+    return np.searchsorted(timer_begins, times, side='right') - 1
+
+
+def get_chain_latencies(chain: Chain, timings: Dict[str, NodeTimings]) -> np.ndarray:
+    """
+    Get end-to-end latencies of a chain.
+
+    Messages published by the source node are followed hop by hop, using publication times from
+    matched rclcpp/rcl/rmw publish instances. A message is consumed by the first subscription callback
+    of the next node that starts at or after its publication. If that node has a timer, its output is
+    published by the first timer callback that starts after that subscription callback ends; otherwise
+    it is published by the subscription callback itself. The chain ends when the subscription callback
+    of the sink node ends. All messages are followed at once for every hop.
+
+    :param chain: the chain
+    :param timings: the timings of (at least) the nodes of the chain
+    :return: the end-to-end latency (ns) for every message published by the source node that went through
+        the whole chain
+    """
+    no_times = np.array([], dtype=np.int64)
+    start_times = timings[chain.nodes[0]].publishers[chain.topics[0]]
+    times = start_times
+    valid = np.ones(len(times), dtype=bool)
+    for i, topic_name in enumerate(chain.topics):
+        node_timings = timings[chain.nodes[i + 1]]
+        # Subscription callback that consumes the message
+        sub_ranges = node_timings.subscriptions.get(topic_name)
+        if sub_ranges is None or 0 == len(sub_ranges):
+            return no_times
+        sub_indexes = get_next_indexes(sub_ranges.begins, times)
+        valid &= sub_indexes >= 0
+        if i == len(chain.topics) - 1:
+            times = sub_ranges.ends[sub_indexes]
+            break
+        trigger_times = sub_ranges.begins[sub_indexes]
+        if node_timings.timers:
+            # Timer callback that processes the message
+            timer_begins = np.sort(np.concatenate([ranges.begins for ranges in node_timings.timers.values()]))
+            if 0 == len(timer_begins):
+                return no_times
+            timer_indexes = get_timer_periods(sub_ranges.ends[sub_indexes], timer_begins)
+            valid &= timer_indexes >= 0
+            trigger_times = timer_begins[timer_indexes]
+        # Publication of the output message
+        pub_times = node_timings.publishers.get(chain.topics[i + 1], no_times)
+        if 0 == len(pub_times):
+            return no_times
+        pub_indexes = get_next_indexes(pub_times, trigger_times)
+        valid &= pub_indexes >= 0
+        times = pub_times[pub_indexes]
+    return (times - start_times)[valid]
+
+
+def get_chain_summary(
+    session: TraceSession,
+    chains: List[Chain],
+    percentiles: Iterable[float] = (50.0, 90.0, 99.0),
+) -> pd.DataFrame:
+    """
+    Summarize end-to-end latencies of chains.
+
+    :param session: the trace session
+    :param chains: the chains
+    :param percentiles: the percentiles of the latencies to compute
+    :return: the summary, with one row per chain
+    """
+    timings = session.get_node_timings()
+    rows = []
+    for chain in chains:
+        latencies = get_chain_latencies(chain, timings) / 1e6
+        row = {
+            'chain': str(chain),
+            'nodes': ' -> '.join(chain.nodes),
+            'hops': len(chain.topics),
+            'count': len(latencies),
+        }
+        row.update(get_percentile_columns('latency', latencies, percentiles))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def get_kernel_intervals(trace_dir: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Get thread state intervals and IRQ handler intervals from the kernel trace.
+
+    A thread is running between being switched in and switched out. If it is switched out while
+    still runnable, it is preempted until it is switched in again. Otherwise it is blocked until
+    it is woken up, and then waits to run (wakeup latency) until it is switched in.
+
+    :param trace_dir: the path to the directory containing the trace
+    :return: the thread state intervals, with tid, start, end, state, and cpu columns, sorted by tid and start,
+        with the CPU the thread ran on for running intervals and -1 for other states,
+        and the IRQ & softirq handler intervals, with cpu, kind, number, start, and end columns, sorted by start
+    """
+    tids = array('q')
+    starts = array('q')
+    ends = array('q')
+    states = array('b')
+    cpus = array('q')
+    # tid -> (state, start timestamp, cpu)
+    current_states = {}
+
+    def transition(tid: int, state: int, timestamp: int, cpu: int = -1) -> None:
+        current_state = current_states.get(tid)
+        if current_state is not None:
+            tids.append(tid)
+            starts.append(current_state[1])
+            ends.append(timestamp)
+            states.append(current_state[0])
+            cpus.append(current_state[2])
+        current_states[tid] = (state, timestamp, cpu)
+
+    irqs = []
+    # (cpu, kind, number) -> start timestamp
+    irq_starts = {}
+
+    event_names = {
+        'sched_switch',
+        'sched_waking',
+        'sched_wakeup',
+        'irq_handler_entry',
+        'irq_handler_exit',
+        'irq_softirq_entry',
+        'irq_softirq_exit',
+    }
+    for event in read_events(f'{trace_dir}/kernel', event_names):
+        timestamp = event['_timestamp']
+        name = event['_name']
+        if name.startswith('irq_'):
+            kind = 'irq' if name.startswith('irq_handler') else 'softirq'
+            irq_key = (event.get('cpu_id', -1), kind, event['irq'] if 'irq' == kind else event['vec'])
+            if name.endswith('_entry'):
+                irq_starts[irq_key] = timestamp
+            elif irq_key in irq_starts:
+                irqs.append((*irq_key, irq_starts.pop(irq_key), timestamp))
+        elif 'sched_switch' == name:
+            # Ignore the idle task
+            if 0 != event['prev_tid']:
+                # A preempted task is still runnable, i.e., TASK_RUNNING (0), possibly with TASK_REPORT_MAX
+                preempted = 0 == (event['prev_state'] & 0xff)
+                transition(event['prev_tid'], thread_preempted if preempted else thread_blocked, timestamp)
+            if 0 != event['next_tid']:
+                # sched_switch happens on the CPU the next thread runs on
+                transition(event['next_tid'], thread_running, timestamp, event.get('cpu_id', -1))
+        elif thread_blocked == current_states.get(event['tid'], (None,))[0]:
+            # Only the first of sched_waking & sched_wakeup is a transition
+            transition(event['tid'], thread_wakeup, timestamp)
+
+    intervals = pd.DataFrame({
+        'tid': np.frombuffer(tids, dtype=np.int64),
+        'start': np.frombuffer(starts, dtype=np.int64),
+        'end': np.frombuffer(ends, dtype=np.int64),
+        'state': np.frombuffer(states, dtype=np.int8),
+        'cpu': np.frombuffer(cpus, dtype=np.int64),
+    })
+    irq_intervals = pd.DataFrame(irqs, columns=['cpu', 'kind', 'number', 'start', 'end'])
+    return (
+        intervals.sort_values(['tid', 'start'], ignore_index=True),
+        irq_intervals.sort_values('start', ignore_index=True),
+    )
+
+
+def get_state_time_until(starts: np.ndarray, ends: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Get total time spent in intervals up to given times.
+
+    :param starts: the sorted start timestamps of non-overlapping intervals
+    :param ends: the end timestamps of the intervals
+    :param times: the timestamps
+    :return: the total time (ns) spent in the intervals before every timestamp
+    """
+    cumulative = np.concatenate(([0], np.cumsum(ends - starts)))
+    # Last interval that starts at or before the given time
+    indexes = np.searchsorted(starts, times, side='right') - 1
+    valid = indexes >= 0
+    indexes = np.maximum(indexes, 0)
+    partial = np.clip(times - starts[indexes], 0, ends[indexes] - starts[indexes])
+    return np.where(valid, cumulative[indexes] + partial, 0)
+
+
+def get_callback_kernel_stats(session: TraceSession, intervals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join callback instances with thread state intervals.
+
+    For every callback instance, this gives the time its thread spent on the CPU, preempted, waiting
+    to run after a wakeup, and blocked during the callback instance, as well as the wakeup latency of
+    the thread right before the callback instance started. Callback instances and intervals are
+    grouped by thread and joined with binary searches over cumulative state times.
+
+    :param session: the trace session
+    :param intervals: the thread state intervals, see `get_kernel_intervals()`
+    :return: the callback instances with callback_object, tid, timestamp, duration, and time (ns)
+        columns, in chronological order, with NaN times for threads without kernel data
+    """
+    callback_instances = session.data_util.data.callback_instances
+    stats = callback_instances[['callback_object', 'tid', 'timestamp', 'duration']].copy()
+    columns = {
+        thread_running: 'on_cpu',
+        thread_preempted: 'preempted',
+        thread_wakeup: 'wakeup_latency',
+    }
+    # Times are unknown for threads without kernel data
+    for column in list(columns.values()) + ['prior_wakeup_latency']:
+        stats[column] = np.nan
+    tid_intervals = dict(tuple(intervals.groupby('tid')))
+    for tid, instances in stats.groupby('tid'):
+        thread_intervals = tid_intervals.get(tid)
+        if thread_intervals is None:
+            continue
+        stats.loc[instances.index, list(columns.values()) + ['prior_wakeup_latency']] = 0
+        begins = instances['timestamp'].to_numpy(dtype=np.int64)
+        ends = begins + instances['duration'].to_numpy(dtype=np.int64)
+        for state, column in columns.items():
+            state_intervals = thread_intervals.loc[thread_intervals['state'] == state]
+            state_starts = state_intervals['start'].to_numpy(dtype=np.int64)
+            state_ends = state_intervals['end'].to_numpy(dtype=np.int64)
+            if 0 == len(state_starts):
+                continue
+            stats.loc[instances.index, column] = (
+                get_state_time_until(state_starts, state_ends, ends)
+                - get_state_time_until(state_starts, state_ends, begins)
+            )
+            if thread_wakeup == state:
+                # Last wakeup interval that started before the callback instance
+                indexes = np.searchsorted(state_starts, begins, side='right') - 1
+                latencies = np.where(indexes >= 0, state_ends[indexes] - state_starts[indexes], 0)
+                stats.loc[instances.index, 'prior_wakeup_latency'] = latencies
+    stats['blocked'] = stats['duration'] - stats['on_cpu'] - stats['preempted'] - stats['wakeup_latency']
+    return stats
+
+
+def analyze_kernel(session: TraceSession, intervals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Analyze callback instances with kernel data and write results.
+
+    The per-instance results are written to `callback_kernel_stats.csv` under the trace directory.
+
+    :param session: the trace session
+    :param intervals: the thread state intervals, see `get_kernel_intervals()`
+    :return: the per-instance results, with times in ms
+    """
+    stats = get_callback_kernel_stats(session, intervals)
+    owners = session.get_object_owners()
+    owners = owners.loc[owners['kind'] != 'publisher'].rename(columns={'object': 'callback_object'})
+    stats = stats.merge(owners, on='callback_object', how='left')
+    time_columns = ['duration', 'on_cpu', 'preempted', 'wakeup_latency', 'blocked', 'prior_wakeup_latency']
+    stats[time_columns] /= 1e6
+    stats.rename(columns={column: f'{column}_ms' for column in time_columns}, inplace=True)
+    stats_path = os.path.join(session.trace_dir, 'callback_kernel_stats.csv')
+    stats.to_csv(stats_path, index=False)
+    summary = stats.groupby(['node', 'topic', 'kind'], dropna=False)[
+        ['on_cpu_ms', 'preempted_ms', 'wakeup_latency_ms', 'prior_wakeup_latency_ms']
+    ].agg(['mean', 'max'])
+    print(summary.to_string())
+    print(f'Callback instance kernel stats: {stats_path}')
+    return stats
+
+
+class IntervalIndex:
+    """
+    Index of time intervals for overlap queries.
+
+    Intervals are sorted by start once. Intervals overlapping a time window can only start between the window
+    start minus the longest interval and the window end, which is found with binary searches.
+    """
+
+    __slots__ = ('intervals', 'starts', 'ends', 'max_length')
+
+    def __init__(self, intervals: pd.DataFrame) -> None:
+        """
+        Create index.
+
+        :param intervals: the intervals, with start and end (ns) columns
+        """
+        self.intervals = intervals.sort_values('start', kind='stable', ignore_index=True)
+        self.starts = self.intervals['start'].to_numpy(dtype=np.int64)
+        self.ends = self.intervals['end'].to_numpy(dtype=np.int64)
+        self.max_length = int((self.ends - self.starts).max()) if len(self.starts) else 0
+
+    def overlapping(self, start: int, end: int) -> pd.DataFrame:
+        """Get the intervals overlapping the [start, end] time window, sorted by start."""
+        first = np.searchsorted(self.starts, start - self.max_length, side='left')
+        last = np.searchsorted(self.starts, end, side='right')
+        overlaps = self.ends[first:last] > start
+        return self.intervals.iloc[first:last].loc[overlaps]
+
+
+def get_outlier_indexes(values: np.ndarray, top: int, threshold: Optional[float] = None) -> np.ndarray:
+    """
+    Get the indexes of the largest values.
+
+    :param values: the values
+    :param top: the maximum number of indexes
+    :param threshold: the value above which values are outliers, or `None` for the largest values only
+    :return: the indexes, by decreasing value
+    """
+    indexes = np.argsort(values, kind='stable')[::-1][:top]
+    if threshold is not None:
+        indexes = indexes[values[indexes] > threshold]
+    return indexes
+
+
+def get_overlap_durations(starts: np.ndarray, ends: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Get the duration of the overlap of every interval with the [start, end] time window."""
+    return np.maximum(np.minimum(ends, end) - np.maximum(starts, start), 0)
+
+
+def get_outlier_report(
+    session: TraceSession,
+    top: int = 5,
+    threshold_ms: Optional[float] = None,
+    margin_ms: float = 1.0,
+    kernel_intervals: Optional[Tuple[pd.DataFrame, pd.DataFrame]] = None,
+) -> List[Dict]:
+    """
+    Find the worst timer callback intervals and durations, and what happened around them.
+
+    For every timer callback, the largest intervals between callback instances and the largest callback
+    instance durations are outliers. For every outlier, this collects the other callback instances that
+    ran on the same thread during the outlier time window (plus margin), and, with kernel data, the
+    preemption and wakeup latency intervals of that thread and the IRQ & softirq handlers that ran during
+    the window on the CPUs that the thread ran on. The likely cause is the one that took the most time during
+    the outlier time window.
+
+    :param session: the trace session
+    :param top: the maximum number of outliers per timer and metric
+    :param threshold_ms: the value (ms) above which intervals and durations are outliers,
+        or `None` for the largest values only
+    :param margin_ms: the margin (ms) added to both sides of the outlier time window
+    :param kernel_intervals: the thread state intervals and IRQ intervals, see `get_kernel_intervals()`,
+        or `None` to only use the ROS 2 trace
+    :return: the outliers, by timer and decreasing value
+    """
+    threshold = threshold_ms * 1e6 if threshold_ms is not None else None
+    margin = int(margin_ms * 1e6)
+    owners = session.get_object_owners().drop_duplicates('object').set_index('object')
+    callback_instances = session.data_util.data.callback_instances
+    instances = IntervalIndex(pd.DataFrame({
+        'callback_object': callback_instances['callback_object'],
+        'tid': callback_instances['tid'],
+        'start': callback_instances['timestamp'],
+        'end': callback_instances['timestamp'] + callback_instances['duration'],
+    }))
+    states = None
+    running = None
+    irqs = None
+    if kernel_intervals is not None:
+        thread_intervals, irq_intervals = kernel_intervals
+        states = IntervalIndex(thread_intervals.loc[
+            thread_intervals['state'].isin([thread_preempted, thread_wakeup])])
+        running = IntervalIndex(thread_intervals.loc[thread_intervals['state'] == thread_running])
+        irqs = IntervalIndex(irq_intervals)
+    state_names = {thread_preempted: 'preempted', thread_wakeup: 'wakeup_latency'}
+
+    report = []
+    for (node_name, _, kind), callback_objects in session.get_callback_index().items():
+        if node_name is None or 'timer' != kind:
+            continue
+        for callback_object in callback_objects:
+            ranges = session.get_callback_ranges(callback_object)
+            # An interval ends with the callback instance following it, like in get_intervals()
+            windows = {
+                'interval': (ranges.begins[:-1], ranges.begins[1:], 1),
+                'duration': (ranges.begins, ranges.ends, 0),
+            }
+            for metric, (window_starts, window_ends, index_offset) in windows.items():
+                values = window_ends - window_starts
+                for index in get_outlier_indexes(values, top, threshold):
+                    callback_index = int(index) + index_offset
+                    start = int(window_starts[index]) - margin
+                    end = int(window_ends[index]) + margin
+                    outlier = {
+                        'node': node_name,
+                        'callback_object': int(callback_object),
+                        'metric': metric,
+                        'value_ms': values[index] / 1e6,
+                        'callback_index': callback_index,
+                        'time': str(pd.Timestamp(int(ranges.begins[callback_index]), unit='ns')),
+                        'window_start': start,
+                        'window_end': end,
+                    }
+
+                    # Other callback instances of the same thread
+                    overlapping = instances.overlapping(start, end)
+                    is_outlier = (
+                        (overlapping['callback_object'] == callback_object)
+                        & (overlapping['start'] == ranges.begins[callback_index])
+                    )
+                    tids = overlapping.loc[is_outlier, 'tid'].dropna()
+                    tid = int(tids.iloc[0]) if len(tids) else None
+                    others = overlapping.loc[overlapping['callback_object'] != callback_object]
+                    if tid is not None:
+                        others = others.loc[others['tid'] == tid]
+                    outlier['tid'] = tid
+                    outlier['callbacks'] = [
+                        {
+                            'node': owners['node'].get(other_object),
+                            'topic': owners['topic'].get(other_object),
+                            'kind': owners['kind'].get(other_object),
+                            'offset_ms': (other_start - start) / 1e6,
+                            'duration_ms': (other_end - other_start) / 1e6,
+                        }
+                        for other_object, other_start, other_end in zip(
+                            others['callback_object'], others['start'], others['end'])
+                    ]
+                    causes = {
+                        'callbacks': get_overlap_durations(
+                            others['start'].to_numpy(dtype=np.int64), others['end'].to_numpy(dtype=np.int64),
+                            start, end).sum(),
+                    }
+
+                    # Thread states and IRQs from the kernel trace
+                    if states is not None and tid is not None:
+                        thread_states = states.overlapping(start, end)
+                        thread_states = thread_states.loc[thread_states['tid'] == tid]
+                        outlier['thread_states'] = [
+                            {
+                                'state': state_names[state],
+                                'offset_ms': (state_start - start) / 1e6,
+                                'duration_ms': (state_end - state_start) / 1e6,
+                            }
+                            for state, state_start, state_end in zip(
+                                thread_states['state'], thread_states['start'], thread_states['end'])
+                        ]
+                        overlaps = get_overlap_durations(
+                            thread_states['start'].to_numpy(dtype=np.int64),
+                            thread_states['end'].to_numpy(dtype=np.int64),
+                            start, end)
+                        for state, name in state_names.items():
+                            causes[name] = overlaps[(thread_states['state'] == state).to_numpy()].sum()
+                    if irqs is not None and tid is not None:
+                        # IRQs on other CPUs do not delay the thread
+                        running_intervals = running.overlapping(start, end)
+                        cpus = sorted(set(running_intervals.loc[running_intervals['tid'] == tid, 'cpu'].tolist()))
+                        outlier['cpus'] = cpus
+                        window_irqs = irqs.overlapping(start, end)
+                        window_irqs = window_irqs.loc[window_irqs['cpu'].isin(cpus)].assign(
+                            duration_ms=lambda df: (df['end'] - df['start']) / 1e6)
+                        irq_summary = window_irqs.groupby(['kind', 'number'], as_index=False)['duration_ms'].agg(
+                            count='count', total_ms='sum', max_ms='max')
+                        outlier['irqs'] = irq_summary.to_dict('records')
+                        causes['irqs'] = get_overlap_durations(
+                            window_irqs['start'].to_numpy(dtype=np.int64),
+                            window_irqs['end'].to_numpy(dtype=np.int64),
+                            start, end).sum()
+
+                    outlier.update({f'{cause}_ms': value / 1e6 for cause, value in causes.items()})
+                    cause, value = max(causes.items(), key=lambda item: item[1])
+                    outlier['likely_cause'] = cause if value > 0 else None
+                    report.append(outlier)
+    return report
+
+
+def write_outlier_report(report: List[Dict], trace_dir: str) -> None:
+    """
+    Write outlier report as JSON and HTML.
+
+    The report is written to `outlier_report.json` and `outlier_report.html` under the trace directory.
+    The HTML report has a summary table and, for every outlier, tables of the callbacks, thread states,
+    and IRQs during its time window.
+
+    :param report: the outliers, see `get_outlier_report()`
+    :param trace_dir: the path to the directory containing the trace
+    """
+    def default(value):
+        # NumPy scalars
+        return value.item()
+
+    json_path = os.path.join(trace_dir, 'outlier_report.json')
+    with open(json_path, 'w') as f:
+        json.dump(report, f, indent=2, default=default)
+
+    details = ('callbacks', 'thread_states', 'irqs')
+    summary = pd.DataFrame(
+        [{key: value for key, value in outlier.items() if key not in details} for outlier in report])
+    sections = [f'<h1>Outlier report: {trace_dir}</h1>', summary.to_html(float_format='{:.3f}'.format)]
+    for i, outlier in enumerate(report):
+        sections.append(
+            f"<h2>{i}: {outlier['node']} timer {outlier['metric']} of {outlier['value_ms']:.3f} ms "
+            f"at {outlier['time']}</h2>")
+        for detail in details:
+            if outlier.get(detail):
+                sections.append(f'<h3>{detail}</h3>')
+                sections.append(pd.DataFrame(outlier[detail]).to_html(index=False, float_format='{:.3f}'.format))
+    html_path = os.path.join(trace_dir, 'outlier_report.html')
+    with open(html_path, 'w') as f:
+        f.write('<html><body>\n' + '\n'.join(sections) + '\n</body></html>\n')
+    print(f'Outlier report ({len(report)} outliers): {json_path}, {html_path}')
+
+
+def get_thread_utilization(session: TraceSession) -> pd.DataFrame:
+    """
+    Get the utilization of every thread that executed callbacks, e.g., every thread of a multithreaded executor.
+
+    The busy time of a thread is the total duration of the callback instances it executed, since callback
+    instances of the same thread do not overlap. The utilization is the busy time divided by the time between
+    the first callback instance start and the last callback instance end of all threads.
+
+    :param session: the trace session
+    :return: the utilization, with one row per thread
+    """
+    callback_instances = session.data_util.data.callback_instances
+    callback_instances = callback_instances.loc[callback_instances['tid'].notna()]
+    begins = callback_instances['timestamp'].to_numpy(dtype=np.int64)
+    durations = callback_instances['duration'].to_numpy(dtype=np.int64)
+    span = (begins + durations).max() - begins.min() if len(begins) else 0
+    owners = session.get_object_owners()
+    owners = owners.loc[owners['kind'] != 'publisher'].drop_duplicates('object').set_index('object')['node']
+    utilization = pd.DataFrame({
+        'tid': callback_instances['tid'].to_numpy(dtype=np.int64),
+        'callback_object': callback_instances['callback_object'].to_numpy(),
+        'node': callback_instances['callback_object'].map(owners).to_numpy(),
+        'duration': durations,
+    }).groupby('tid').agg(
+        callbacks=('callback_object', 'nunique'),
+        nodes=('node', 'nunique'),
+        instances=('duration', 'size'),
+        busy=('duration', 'sum'),
+        max_duration=('duration', 'max'),
+    ).reset_index()
+    utilization['utilization'] = utilization['busy'] / span if span else np.nan
+    utilization['busy'] /= 1e6
+    utilization['max_duration'] /= 1e6
+    return utilization.rename(columns={'busy': 'busy_ms', 'max_duration': 'max_duration_ms'})
+
+
+def get_concurrency(begins: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the number of intervals running in parallel over time.
+
+    All interval starts and ends are sorted once, and the concurrency level is their cumulative sum,
+    with ends before starts at the same time, so that back-to-back intervals are not counted as parallel.
+
+    :param begins: the interval begin timestamps
+    :param ends: the interval end timestamps
+    :return: the times at which the concurrency level changes, and the level from each time to the next one
+    """
+    times = np.concatenate((begins, ends)).astype(np.int64)
+    steps = np.repeat(np.array([1, -1], dtype=np.int64), [len(begins), len(ends)])
+    order = np.lexsort((steps, times))
+    return times[order], np.cumsum(steps[order])
+
+
+def get_concurrency_levels(times: np.ndarray, levels: np.ndarray) -> pd.DataFrame:
+    """
+    Get the time spent at every concurrency level.
+
+    :param times: the times at which the concurrency level changes, see `get_concurrency()`
+    :param levels: the concurrency levels, see `get_concurrency()`
+    :return: the time (ms) and fraction of time at every level, from 0 to the maximum level
+    """
+    if 0 == len(times):
+        return pd.DataFrame(columns=['level', 'time_ms', 'fraction'])
+    level_times = np.bincount(levels[:-1], weights=np.diff(times), minlength=levels.max() + 1)
+    return pd.DataFrame({
+        'level': np.arange(len(level_times)),
+        'time_ms': level_times / 1e6,
+        'fraction': level_times / level_times.sum(),
+    })
+
+
+def get_concurrency_windows(times: np.ndarray, levels: np.ndarray, window: int) -> pd.DataFrame:
+    """
+    Get the mean and maximum concurrency level over time windows.
+
+    The mean levels are computed from the cumulative integral of the concurrency level at the window bounds.
+
+    :param times: the times at which the concurrency level changes, see `get_concurrency()`
+    :param levels: the concurrency levels, see `get_concurrency()`
+    :param window: the window duration (ns)
+    :return: the mean and maximum level for every window
+    """
+    if 0 == len(times):
+        return pd.DataFrame(columns=['window_start', 'mean_level', 'max_level'])
+    # The last window ends with the last interval
+    bounds = np.append(np.arange(times[0], times[-1], window, dtype=np.int64), times[-1])
+    areas = np.concatenate(([0], np.cumsum(levels[:-1] * np.diff(times))))
+    indexes = np.searchsorted(times, bounds, side='right') - 1
+    bound_areas = areas[indexes] + levels[indexes] * (bounds - times[indexes])
+    # Maximum of the level at the window start and the levels set during the window
+    max_levels = levels[indexes[:-1]].copy()
+    window_indexes = (times - bounds[0]) // window
+    in_windows = window_indexes < len(max_levels)
+    np.maximum.at(max_levels, window_indexes[in_windows], levels[in_windows])
+    return pd.DataFrame({
+        'window_start': bounds[:-1],
+        'mean_level': np.diff(bound_areas) / np.diff(bounds),
+        'max_level': max_levels,
+    })
+
+
+def get_fifo_indexes(begins: np.ndarray, pub_times: np.ndarray) -> np.ndarray:
+    """
+    Get the message taken by every callback instance of a subscription, assuming messages are taken in order.
+
+    Every callback instance takes the oldest message that was published before it starts and that was not
+    taken yet, if any, i.e., the number of messages taken after callback instance `i` is
+    `t_i = min(t_(i-1) + 1, c_i)`, with `c_i` the number of messages published at or before it starts.
+    This is computed for all callback instances at once as `t_i = i + min(1, min_(k<=i)(c_k - k))`.
+    Messages that are dropped, e.g., when the queue is full, are not accounted for.
+
+    :param begins: the sorted callback instance begin timestamps
+    :param pub_times: the sorted publication timestamps of the messages
+    :return: the index of the message taken by every callback instance, or -1 if it does not take a message
+    """
+    if not len(begins):
+        return np.array([], dtype=np.int64)
+    positions = np.arange(len(begins))
+    counts = np.searchsorted(pub_times, begins, side='right')
+    taken = positions + np.minimum(1, np.minimum.accumulate(counts - positions))
+    takes = np.diff(taken, prepend=0) > 0
+    return np.where(takes, taken - 1, -1)
+
+
+def get_queueing_delays(session: TraceSession, percentiles: Iterable[float] = (50.0, 90.0, 99.0)) -> pd.DataFrame:
+    """
+    Summarize the queueing delay of every subscription callback.
+
+    The queueing delay of a message is the time between its publication, i.e., its arrival at the subscription
+    for publishers and subscriptions on the same host, and the start of the subscription callback instance that
+    takes it. With rmw_take events, every take is matched with the first callback instance of the subscription
+    that starts at or after it, and the source timestamp of the taken message is used as its publication time.
+    Otherwise, the messages published on the topic are assumed to be taken in order, see `get_fifo_indexes()`.
+
+    :param session: the trace session
+    :param percentiles: the percentiles of the delays to compute
+    :return: the summary, with one row per subscription callback, and how messages were matched
+    """
+    data = session.data_util.data
+    publishers = data.rcl_publishers
+    pub_store = session.get_publish_store()
+    references = {
+        callback_object: reference for reference, callback_object in data.callback_objects['callback_object'].items()
+    }
+    subscription_handles = data.subscription_objects['subscription_handle'].to_dict()
+    rmw_handles = data.rcl_subscriptions['rmw_handle'].to_dict()
+    # Take events are only available with recent versions of the instrumentation and tracetools_analysis
+    takes = getattr(data, 'rmw_take_instances', None)
+    if takes is not None and len(takes):
+        takes = takes[takes['taken'].astype(bool)].sort_values('timestamp')
+        takes_by_handle = dict(tuple(takes.groupby('subscription_handle')))
+    else:
+        takes_by_handle = {}
+    rows = []
+    for (node_name, topic_name, kind), callback_objects in session.get_callback_index().items():
+        if node_name is None or 'subscription' != kind:
+            continue
+        pub_times = None
+        for callback_object in callback_objects:
+            sub_begins = session.get_callback_ranges(callback_object).begins
+            rmw_handle = rmw_handles.get(subscription_handles.get(references.get(callback_object)))
+            sub_takes = takes_by_handle.get(rmw_handle)
+            if sub_takes is not None:
+                matching = 'take'
+                indexes = get_next_indexes(sub_begins, sub_takes['timestamp'].to_numpy(dtype=np.int64))
+                source_times = sub_takes['source_timestamp'].to_numpy(dtype=np.int64)[indexes >= 0]
+                delays = (sub_begins[indexes[indexes >= 0]] - source_times) / 1e6
+            else:
+                matching = 'fifo'
+                if pub_times is None:
+                    pub_times = np.sort(np.concatenate([np.array([], dtype=np.int64)] + [
+                        pub_store.get(int(pub_handle))
+                        for pub_handle in publishers.index[publishers['topic_name'] == topic_name]
+                    ]))
+                indexes = get_fifo_indexes(sub_begins, pub_times)
+                delays = (sub_begins[indexes >= 0] - pub_times[indexes[indexes >= 0]]) / 1e6
+            row = {
+                'node': node_name,
+                'topic': topic_name,
+                'callback_object': callback_object,
+                'matching': matching,
+                'messages': len(delays),
+            }
+            row.update(get_percentile_columns('delay', delays, percentiles))
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def analyze_concurrency(session: TraceSession, window: float = 1.0) -> None:
+    """
+    Analyze the execution of callbacks by threads and write results.
+
+    The utilization of every thread is written to `thread_utilization.csv`, the time spent at every concurrency
+    level (number of callback instances running in parallel) to `concurrency_levels.csv`, the mean and maximum
+    concurrency level over time to `concurrency_windows.csv`, and the queueing delays of subscription callbacks
+    to `queueing_delays.csv`, under the trace directory.
+
+    :param session: the trace session
+    :param window: the window duration (s) for the concurrency level over time
+    """
+    callback_instances = session.data_util.data.callback_instances
+    begins = callback_instances['timestamp'].to_numpy(dtype=np.int64)
+    times, levels = get_concurrency(begins, begins + callback_instances['duration'].to_numpy(dtype=np.int64))
+    results = {
+        'thread_utilization': get_thread_utilization(session),
+        'concurrency_levels': get_concurrency_levels(times, levels),
+        'concurrency_windows': get_concurrency_windows(times, levels, int(window * 1e9)),
+        'queueing_delays': get_queueing_delays(session),
+    }
+    paths = []
+    for name, df in results.items():
+        path = os.path.join(session.trace_dir, f'{name}.csv')
+        df.to_csv(path, index=False)
+        paths.append(path)
+    print(results['thread_utilization'].to_string(index=False, float_format='{:.3f}'.format))
+    print(results['concurrency_levels'].to_string(index=False, float_format='{:.3f}'.format))
+    print(results['queueing_delays'].drop(columns='callback_object').to_string(
+        index=False, float_format='{:.3f}'.format))
+    print(f"Concurrency: {', '.join(paths)}")
+
+
+class StreamingAnalysis:
+    """
+    Streaming analysis of callback durations, callback intervals, and publish latencies.
+
+    Events are consumed one at a time and aggregated over consecutive time windows, so that only
+    the statistics of the current window and the state of in-flight callbacks and publications
+    are kept in memory, regardless of trace length. Values are also added to a quantile sketch
+    per object and metric for statistics over the whole trace. Definition events (nodes, publishers,
+    subscriptions, timers, etc.) are kept so that they can be processed to identify objects.
+    """
+
+    def __init__(self, window: Optional[int]) -> None:
+        """
+        Create streaming analysis.
+
+        :param window: the window duration (ns), or `None` to not compute per-window results
+        """
+        self.window = window
+        self.window_start = None
+        self.definition_events = []
+        # tid -> (callback object, start timestamp)
+        self._callback_starts = {}
+        # callback object -> previous start timestamp
+        self._previous_callback_starts = {}
+        # message -> rclcpp_publish timestamp
+        self._rclcpp_publishes = {}
+        # message -> (publisher handle, rclcpp_publish timestamp)
+        self._rcl_publishes = {}
+        # (kind, object, metric) -> [count, total, max]
+        self._stats = {}
+        # (kind, object, metric) -> sketch over the whole trace
+        self.sketches = {}
+
+    def _add(self, kind: str, obj: int, metric: str, value: int) -> None:
+        sketch = self.sketches.get((kind, obj, metric))
+        if sketch is None:
+            sketch = QuantileSketch()
+            self.sketches[(kind, obj, metric)] = sketch
+        sketch.add(value)
+        stats = self._stats.get((kind, obj, metric))
+        if stats is None:
+            self._stats[(kind, obj, metric)] = [1, value, value]
+        else:
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+    def process_event(self, event: Dict) -> Optional[pd.DataFrame]:
+        """
+        Process event.
+
+        :param event: the event, as a dict
+        :return: the results of the previous window if this event is past it, otherwise `None`
+        """
+        timestamp = event['_timestamp']
+        results = None
+        if self.window_start is None:
+            self.window_start = timestamp
+        elif self.window is not None and timestamp >= self.window_start + self.window:
+            results = self.flush()
+            # Skip empty windows
+            self.window_start += (timestamp - self.window_start) // self.window * self.window
+
+        name = event['_name']
+        if 'ros2:callback_start' == name:
+            callback = event['callback']
+            self._callback_starts[event['vtid']] = (callback, timestamp)
+            previous_start = self._previous_callback_starts.get(callback)
+            if previous_start is not None:
+                self._add('callback', callback, 'interval', timestamp - previous_start)
+            self._previous_callback_starts[callback] = timestamp
+        elif 'ros2:callback_end' == name:
+            start = self._callback_starts.pop(event['vtid'], None)
+            if start is not None and start[0] == event['callback']:
+                self._add('callback', start[0], 'duration', timestamp - start[1])
+        elif 'ros2:rclcpp_publish' == name:
+            self._rclcpp_publishes[event['message']] = timestamp
+        elif 'ros2:rcl_publish' == name:
+            rclcpp_timestamp = self._rclcpp_publishes.pop(event['message'], None)
+            if rclcpp_timestamp is not None:
+                self._rcl_publishes[event['message']] = (event['publisher_handle'], rclcpp_timestamp)
+        elif 'ros2:rmw_publish' == name:
+            rcl_publish = self._rcl_publishes.pop(event['message'], None)
+            if rcl_publish is not None:
+                self._add('publisher', rcl_publish[0], 'latency', timestamp - rcl_publish[1])
+        elif name in definition_event_names:
+            self.definition_events.append(event)
+        return results
+
+    def flush(self) -> Optional[pd.DataFrame]:
+        """
+        Get the results of the current window and reset them.
+
+        :return: the results, with one row per (kind, object, metric), or `None` if there are none
+        """
+        if not self._stats:
+            return None
+        results = pd.DataFrame(
+            [
+                (self.window_start, kind, obj, metric, count, total / count / 1e6, max_value / 1e6)
+                for (kind, obj, metric), (count, total, max_value) in self._stats.items()
+            ],
+            columns=['window_start', 'kind', 'object', 'metric', 'count', 'mean_ms', 'max_ms'],
+        )
+        self._stats = {}
+        return results
+
+    def process(self, events: Iterable[Dict]) -> Iterator[pd.DataFrame]:
+        """
+        Process events and yield the results of every window.
+
+        :param events: the events, as dicts
+        :return: the results of every non-empty window
+        """
+        for event in events:
+            results = self.process_event(event)
+            if results is not None:
+                yield results
+        results = self.flush()
+        if results is not None:
+            yield results
+
+
+def analyze_stream(trace_dir: str, window: float, event_filter: Optional[EventFilter] = None) -> None:
+    """
+    Analyze trace in streaming mode and write per-window results.
+
+    The results are written to `stream_windows.csv` under the trace directory as they are computed,
+    the percentiles over the whole trace are written to `stream_summary.csv`, and the owners of the
+    callback objects and publisher handles are written to `stream_objects.csv`.
+
+    :param trace_dir: the path to the directory containing the trace
+    :param window: the window duration (s)
+    :param event_filter: the filter applied while reading the trace, or `None` to process all events
+    """
+    analysis = StreamingAnalysis(int(window * 1e9))
+    events = read_events(f'{trace_dir}/ust', event_filter=event_filter)
+    windows_path = os.path.join(trace_dir, 'stream_windows.csv')
+    with open(windows_path, 'w') as f:
+        header = True
+        for results in analysis.process(events):
+            results.to_csv(f, header=header, index=False)
+            header = False
+            durations = results.loc[results['metric'] == 'duration', 'max_ms']
+            print(
+                f"Window {pd.Timestamp(results['window_start'].iloc[0], unit='ns')}: "
+                f'{len(results)} results, max callback duration {durations.max():.3f} ms')
+    print(f'Window results: {windows_path}')
+
+    # Process definition events to identify objects
+    session = TraceSession(trace_dir, Ros2Handler.process(analysis.definition_events).data)
+    objects_path = os.path.join(trace_dir, 'stream_objects.csv')
+    owners = session.get_object_owners()
+    owners.to_csv(objects_path, index=False)
+    print(f'Objects: {objects_path}')
+    summary = get_sketch_summary(analysis.sketches, ['kind', 'object', 'metric'])
+    summary = summary.merge(
+        owners.drop_duplicates('object')[['object', 'node', 'topic']], on='object', how='left')
+    summary_path = os.path.join(trace_dir, 'stream_summary.csv')
+    summary.to_csv(summary_path, index=False)
+    print(f'Summary: {summary_path}')
+
+
+class LiveAnalysis(StreamingAnalysis):
+    """
+    Live analysis of callback durations, callback intervals, and publish latencies.
+
+    Events are consumed one at a time as the trace is being written. For every callback and publisher, only
+    the most recent samples are kept to compute rolling percentiles, and timer callback intervals longer
+    than the timer period (plus tolerance) and durations longer than the period are counted as deadline misses.
+    """
+
+    def __init__(self, samples: int, tolerance: float = 0.1) -> None:
+        """
+        Create live analysis.
+
+        :param samples: the number of most recent samples used for rolling percentiles
+        :param tolerance: the tolerance for timer callback intervals, as a fraction of the timer period
+        """
+        super().__init__(None)
+        self.samples = samples
+        self.tolerance = tolerance
+        # timer handle -> period
+        self._timer_periods = {}
+        # callback object -> period
+        self._callback_periods = {}
+        # (kind, object, metric) -> [samples, next sample index, count, misses]
+        self._rolling = {}
+
+    def _add(self, kind: str, obj: int, metric: str, value: int) -> None:
+        rolling = self._rolling.get((kind, obj, metric))
+        if rolling is None:
+            rolling = [np.zeros(self.samples, dtype=np.int64), 0, 0, 0]
+            self._rolling[(kind, obj, metric)] = rolling
+        rolling[0][rolling[1]] = value
+        rolling[1] = (rolling[1] + 1) % self.samples
+        rolling[2] += 1
+        period = self._callback_periods.get(obj)
+        if period is not None:
+            if 'interval' == metric and value > period * (1.0 + self.tolerance):
+                rolling[3] += 1
+            elif 'duration' == metric and value > period:
+                rolling[3] += 1
+
+    def process_event(self, event: Dict) -> Optional[pd.DataFrame]:
+        name = event['_name']
+        if 'ros2:rcl_timer_init' == name:
+            self._timer_periods[event['timer_handle']] = event['period']
+        elif 'ros2:rclcpp_timer_callback_added' == name:
+            period = self._timer_periods.get(event['timer_handle'])
+            if period is not None:
+                self._callback_periods[event['callback']] = period
+        return super().process_event(event)
+
+    def get_status(self, percentiles: Iterable[float] = (50.0, 90.0, 99.0)) -> pd.DataFrame:
+        """
+        Get rolling statistics.
+
+        :param percentiles: the percentiles to compute
+        :return: the statistics, with one row per (kind, object, metric)
+        """
+        rows = []
+        for (kind, obj, metric), (values, _, count, misses) in self._rolling.items():
+            values = values[:min(count, self.samples)] / 1e6
+            row = {'kind': kind, 'object': obj, 'metric': metric, 'count': count}
+            for percentile in percentiles:
+                row[f'p{percentile:g}_ms'] = np.percentile(values, percentile)
+            row['max_ms'] = values.max()
+            period = self._callback_periods.get(obj)
+            row['period_ms'] = period / 1e6 if period is not None else np.nan
+            row['misses'] = misses
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def get_chunk_index(chunk_dir: str) -> int:
+    """Get index of trace chunk from its directory name, e.g., `20220101T000000+0000-20220101T000001+0000-3`."""
+    return int(os.path.basename(chunk_dir).rsplit('-', 1)[-1])
+
+
+def read_live_events(source: str, poll_interval: float = 0.1) -> Iterator[Optional[Dict]]:
+    """
+    Read events from a trace as it is being written.
+
+    The source is either an LTTng live URL, e.g., `net://localhost/host/<hostname>/<session name>`, or the
+    output directory of a tracing session with rotation enabled, in which case complete trace chunks under
+    `archives/` are read in order as they appear.
+
+    :param source: the LTTng live URL or the path to the tracing session output directory
+    :param poll_interval: the time (s) to wait before checking again when no new events are available
+    :return: the events, as dicts, or `None` whenever no new events are available yet
+    """
+    if source.startswith('net://'):
+        import bt2
+        from tracetools_read.trace import event_to_dict
+        msg_it = bt2.TraceCollectionMessageIterator(bt2.ComponentSpec.from_named_plugin_and_component_class(
+            'ctf', 'lttng-live', {'inputs': [source], 'session-not-found-action': 'end'}))
+        while True:
+            try:
+                msg = next(msg_it)
+            except bt2.TryAgain:
+                yield None
+                time.sleep(poll_interval)
+                continue
+            except StopIteration:
+                return
+            if type(msg) is bt2._EventMessageConst:
+                yield event_to_dict(msg)
+
+    read_chunks = set()
+    while True:
+        chunk_dirs = sorted(
+            (
+                chunk_dir
+                for chunk_dir in glob.glob(os.path.join(source, 'archives', '*'))
+                if chunk_dir not in read_chunks
+            ),
+            key=get_chunk_index,
+        )
+        for chunk_dir in chunk_dirs:
+            # Chunks are only moved to archives/ once complete
+            if os.path.isdir(os.path.join(chunk_dir, 'ust')):
+                yield from read_events(os.path.join(chunk_dir, 'ust'))
+            read_chunks.add(chunk_dir)
+        yield None
+        time.sleep(poll_interval)
+
+
+def analyze_live(source: str, samples: int, update_interval: float = 1.0) -> None:
+    """
+    Analyze trace as it is being written and periodically show rolling statistics.
+
+    The statistics are also written to `live_status.csv` under the tracing session output directory,
+    or under the current directory for an LTTng live URL, on every update. Stop with Ctrl+C.
+
+    :param source: the LTTng live URL or the path to the tracing session output directory,
+        see `read_live_events()`
+    :param samples: the number of most recent samples used for rolling percentiles
+    :param update_interval: the time (s) between updates
+    """
+    analysis = LiveAnalysis(samples)
+    status_dir = '.' if source.startswith('net://') else source
+    status_path = os.path.join(status_dir, 'live_status.csv')
+    owners = None
+    num_definition_events = 0
+
+    def update() -> None:
+        nonlocal owners
+        nonlocal num_definition_events
+        # Only process definition events again when there are new ones
+        if num_definition_events != len(analysis.definition_events):
+            num_definition_events = len(analysis.definition_events)
+            session = TraceSession(status_dir, Ros2Handler.process(analysis.definition_events).data)
+            owners = session.get_object_owners().drop_duplicates('object')[['object', 'node', 'topic']]
+        status = analysis.get_status()
+        if status.empty:
+            print('Waiting for events...')
+            return
+        if owners is not None:
+            status = status.merge(owners, on='object', how='left')
+        status.to_csv(status_path, index=False)
+        print(status.drop(columns='object').to_string(index=False, float_format='{:.3f}'.format))
+        print(f'Live status: {status_path}')
+
+    last_update = time.monotonic()
+    try:
+        for event in read_live_events(source):
+            if event is not None:
+                analysis.process_event(event)
+            now = time.monotonic()
+            if now - last_update >= update_interval:
+                update()
+                last_update = now
+    except KeyboardInterrupt:
+        pass
+    update()
+
+
 def plot_timer(
     ranges_timer: TimeRanges,
+    trace_dir: Optional[str],
     title: str = 'Timer callback interval and duration over time',
     xlabel: str = 'time (s)',
     ylabel_interval: str = 'callback interval (ms)',
@@ -274,11 +2381,29 @@ def plot_timer(
     color_interval: str = 'b',
     color_duration: str = 'r',
     name: str = '5_analysis_timer',
-) -> None:
-    """Plot timer callback interval and duration."""
+    max_points: Optional[int] = None,
+    export: ExportSettings = ExportSettings(),
+) -> 'Figure':
+    """
+    Plot timer callback interval and duration.
+
+    :param ranges_timer: the timer callback instance ranges
+    :param trace_dir: the path to the directory under which the plot files are written, or `None` to not write them
+    :param max_points: the maximum number of points of the interval and duration series, see
+        `get_decimated_indexes()`, or `None` to plot all points
+    :param export: the settings of the plot files
+    :return: the figure
+    """
     timer_period_x, timer_period_y = get_intervals(ranges_timer)
     timer_duration_x, timer_duration_y = get_begins_durations(ranges_timer)
-
+    if max_points is not None:
+        # Statistics above are computed with all values
+        indexes = get_decimated_indexes(timer_period_y, max_points)
+        timer_period_x, timer_period_y = timer_period_x[indexes], timer_period_y[indexes]
+        indexes = get_decimated_indexes(timer_duration_y, max_points)
+        timer_duration_x, timer_duration_y = timer_duration_x[indexes], timer_duration_y[indexes]
+
+    import matplotlib.pyplot as plt
     fig, (ax1, ax2) = plt.subplots(2, 1, constrained_layout=True)
     ax1.plot(timer_period_x, timer_period_y, marker + color_interval, label=label_interval)
     ax2.plot(timer_duration_x, timer_duration_y, marker + color_duration, label=label_duration)
@@ -293,241 +2418,799 @@ def plot_timer(
     ax1.set_xticklabels([])
     fig.align_ylabels()
 
-    filename = f'{trace_name}/{name}'
-    fig.savefig(f'{filename}.png')
-    fig.savefig(f'{filename}.svg')
-    fig.savefig(f'{filename}.pdf')
+    if trace_dir is not None:
+        wait_for_exports(save_figure(fig, f'{trace_dir}/{name}', export))
+    return fig
+
+
+def _init_export_worker() -> None:
+    import matplotlib.pyplot as plt
+    plt.switch_backend('agg')
+
+
+def _save_figure_worker(fig_data: bytes, rc: Dict, path: str) -> None:
+    import matplotlib.pyplot as plt
+    with plt.rc_context(rc):
+        pickle.loads(fig_data).savefig(path)
+
+
+def save_figure(
+    fig: 'Figure',
+    filename: str,
+    export: ExportSettings = ExportSettings(),
+    profiler: Optional[StageProfiler] = None,
+) -> List[Future]:
+    """
+    Save figure in all export formats.
+
+    If more than 1 export job is configured, the figure is written to the different formats
+    in parallel in worker processes, and the returned futures must be passed to `wait_for_exports()`.
+
+    :param fig: the figure
+    :param filename: the path of the files without extension
+    :param export: the settings of the plot files
+    :param profiler: the profiler of the export stages, or `None`
+    :return: the futures of the files being written in parallel, if any
+    """
+    if export.jobs <= 1:
+        for export_format in export.formats:
+            with get_stage(profiler, 'savefig'):
+                fig.savefig(f'{filename}.{export_format}')
+        return []
+    with export_executors_lock:
+        export_executor = export_executors.get(export.jobs)
+        if export_executor is None:
+            export_executor = ProcessPoolExecutor(max_workers=export.jobs, initializer=_init_export_worker)
+            export_executors[export.jobs] = export_executor
+    import matplotlib.pyplot as plt
+    fig_data = pickle.dumps(fig)
+    rc = {key: value for key, value in plt.rcParams.items() if 'backend' != key}
+    return [
+        export_executor.submit(_save_figure_worker, fig_data, rc, f'{filename}.{export_format}')
+        for export_format in export.formats
+    ]
+
+
+def wait_for_exports(futures: List[Future], profiler: Optional[StageProfiler] = None) -> None:
+    """
+    Wait for figures being saved in parallel, see `save_figure()`.
+
+    :param futures: the futures of the files being written
+    :param profiler: the profiler of the export stages, or `None`
+    """
+    if not futures:
+        return
+    with get_stage(profiler, 'wait_for_exports') as stage:
+        stage['rows'] = len(futures)
+        for future in futures:
+            future.result()
 
 
 def to_relative_ms(
-    times_lists: List[List[pd.Timestamp]],
+    times_lists: List[np.ndarray],
     ranges_lists: List[TimeRanges],
     time_offset: float,
-) -> None:
-    """Transform timestamps to relative time in ms from beginning."""
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Transform timestamps to relative time in ms from beginning.
+
+    :param times_lists: the lists of timestamps (ns)
+    :param ranges_lists: the lists of time ranges
+    :param time_offset: the offset (ms) to add to relative times
+    :return: the relative timestamps (ms), and the relative time ranges as (N, 3) arrays of begin,
+        end, and duration (ms)
+    """
     start = min(
-        min(itertools.chain.from_iterable(times_lists)),
-        min(ranges[0] for ranges_list in ranges_lists for ranges in ranges_list),
+        [times.min() for times in times_lists if len(times)]
+        + [ranges.begins.min() for ranges in ranges_lists if len(ranges)]
+    )
+    return (
+        [time_offset + (times - start) / 1e6 for times in times_lists],
+        [ranges.to_relative_ms(start, time_offset) for ranges in ranges_lists],
     )
-    for times_list in times_lists:
-        times_list[:] = [time_offset + ((time - start).total_seconds() * 1000.0) for time in times_list]
-    for ranges_list in ranges_lists:
-        ranges_list[:] = [
-            (
-                time_offset + ((ranges[0] - start).total_seconds() * 1000.0),
-                time_offset + ((ranges[1] - start).total_seconds() * 1000.0),
-                ranges[2].total_seconds() * 1000.0
-            )
-            for ranges in ranges_list
-        ]
 
 
 def add_markers_to_axis(
-    ax: plt.Axes,
+    ax: 'Axes',
     label: str,
-    times: List[Tuple[str, float]],
+    times: np.ndarray,
+    colours: np.ndarray,
     marker: str = 'o',
     markersize: int = 8,
 ) -> None:
-    """Add time markers to axis."""
-    for color, time in times:
-        ax.plot([time], [label], marker, color=color, markersize=markersize)
+    """Add time markers to axis, as a single collection."""
+    ax.scatter(times, [label] * len(times), c=colours, marker=marker, s=markersize ** 2)
 
 
 def add_ranges_to_axis(
-    ax: plt.Axes,
+    ax: 'Axes',
     label: str,
-    ranges: List[Tuple[str, Tuple[float, float, float]]],
+    ranges: np.ndarray,
+    colours: np.ndarray,
     linewidth: int = 35,
 ) -> None:
-    """Add start-end ranges to axis."""
-    for color, r in ranges:
-        ax.plot(
-            [r[0], r[1]],
-            [label, label],
-            '-',
-            color=color,
-            linewidth=linewidth,
-            solid_capstyle='butt',  # Prevent line width from affecting length of line
-        )
+    """Add start-end ranges to axis, as a single collection."""
+    lines = ax.hlines([label] * len(ranges), ranges[:, 0], ranges[:, 1], colors=colours, linewidth=linewidth)
+    # Prevent line width from affecting length of line
+    lines.set_capstyle('butt')
 
 
 def get_default_colors() -> List[str]:
     """Get the list of default matplotlib colours."""
+    import matplotlib.pyplot as plt
     return [p['color'] for p in plt.rcParams['axes.prop_cycle']]
 
 
 def plot_chart(
-    times_sub_ObjectCollisionEstimator,
-    times_sub_NDTLocalizer,
-    times_sub_Lanelet2GlobalPlanner,
-    times_sub_Lanelet2MapLoader,
-    times_sub_ParkingPlanner,
-    times_sub_LanePlanner,
-    ranges_timer_BehaviorPlanner,
-    times_pub_BehaviorPlanner,
+    times_subs: List[np.ndarray],
+    ranges_timer: TimeRanges,
+    times_pubs: List[np.ndarray],
+    trace_dir: Optional[str],
     title: str = 'Message reception \& publication and timer execution',  # noqa: W605
     xlabel: str = 'time (ms)',
     name: str = '5_analysis_time_chart',
     num_instances: int = 5,
     time_offset: float = 6.0,  # Manual adjustment
-) -> None:
-    """Plot time chart with msg reception, msg publication, and timer callback instances."""
-    to_relative_ms(
-        [
-            times_sub_ObjectCollisionEstimator,
-            times_sub_NDTLocalizer,
-            times_sub_Lanelet2GlobalPlanner,
-            times_sub_Lanelet2MapLoader,
-            times_sub_ParkingPlanner,
-            times_sub_LanePlanner,
-            times_pub_BehaviorPlanner,
-        ],
-        [
-            ranges_timer_BehaviorPlanner,
-        ],
-        time_offset,
-    )
+    export: ExportSettings = ExportSettings(),
+) -> 'Figure':
+    """
+    Plot time chart with msg reception, msg publication, and timer callback instances.
+
+    :param times_subs: the subscription callback timestamps (ns) for each input topic
+    :param ranges_timer: the timer callback instance ranges
+    :param times_pubs: the publication timestamps (ns) for each output topic
+    :param trace_dir: the path to the directory under which the plot files are written, or `None` to not write them
+    :param export: the settings of the plot files
+    :return: the figure
+    """
+    from matplotlib.colors import to_rgba_array
+    import matplotlib.pyplot as plt
+
+    times_lists, (ranges_timer,) = to_relative_ms(times_subs + times_pubs, [ranges_timer], time_offset)
+    times_subs = times_lists[:len(times_subs)]
+    times_pubs = times_lists[len(times_subs):]
 
     # Keep only the instances we want
-    ranges_timer_BehaviorPlanner = ranges_timer_BehaviorPlanner[:num_instances]
+    ranges_timer = ranges_timer[:num_instances]
     # Pub instances shoud closely follow timer ranges
-    times_pub_BehaviorPlanner = times_pub_BehaviorPlanner[:num_instances]
+    times_pubs = [times_pub[:num_instances] for times_pub in times_pubs]
     # Drop sub times after the last timer callback instance start time
-
-    def filter_time(times: List[float], last_time: float) -> List[float]:
-        return [time for time in times if time <= last_time]
-
-    last_time = ranges_timer_BehaviorPlanner[len(ranges_timer_BehaviorPlanner) - 1][0]
-    times_sub_ObjectCollisionEstimator = filter_time(times_sub_ObjectCollisionEstimator, last_time)
-    times_sub_NDTLocalizer = filter_time(times_sub_NDTLocalizer, last_time)
-    times_sub_Lanelet2GlobalPlanner = filter_time(times_sub_Lanelet2GlobalPlanner, last_time)
-    times_sub_Lanelet2MapLoader = filter_time(times_sub_Lanelet2MapLoader, last_time)
-    times_sub_ParkingPlanner = filter_time(times_sub_ParkingPlanner, last_time)
-    times_sub_LanePlanner = filter_time(times_sub_LanePlanner, last_time)
+    last_time = ranges_timer[-1][0]
+    times_subs = [times_sub[:np.searchsorted(times_sub, last_time, side='right')] for times_sub in times_subs]
 
     # Assign colours to link input messages to corresponding timer callback and output message
-    colours = get_default_colors()[:len(ranges_timer_BehaviorPlanner)]
-    deadlines = [r[0] for r in ranges_timer_BehaviorPlanner]
-    ranges_timer_BehaviorPlanner = [
-        (colours[i], ranges_timer_BehaviorPlanner[i])
-        for i in range(len(ranges_timer_BehaviorPlanner))
-    ]
+    # Cycle through the colours if there are more timer callback instances than colours
+    default_colours = to_rgba_array(get_default_colors())
+    colours = default_colours[np.arange(len(ranges_timer)) % len(default_colours)]
+    deadlines = ranges_timer[:, 0]
 
-    def get_colour(time: float, pre: bool) -> str:
+    def get_colours(times: np.ndarray, pre: bool) -> np.ndarray:
         """
-        Get colour string for given timestamp.
+        Get colours for timestamps.
 
-        :param time: the timestamp
+        :param times: the timestamps
         :param pre: whether the colour should correspond to the next deadline (True) or the previous one (False)
         """
-        for i in range(len(deadlines)):
-            deadline = deadlines[i]
-            if pre:
-                # Given time has to be before given deadline, but after previous deadline
-                if (
-                    (0 == i and time <= deadline)
-                    or (i > 0 and time <= deadline and time > deadlines[i - 1])
-                ):
-                    return colours[i]
-            else:
-                # Given time has to be after given deadline, but before next deadline
-                if (
-                    (len(deadlines) - 1 == i and time >= deadline)
-                    or (i < len(deadlines) - 1 and time >= deadline and time < deadlines[i + 1])
-                ):
-                    return colours[i]
-        assert False, 'should have a matching colour'
-
-    def with_colour(times: List[float], pre: bool) -> List[Tuple[str, float]]:
-        return [(get_colour(times[i], pre), times[i]) for i in range(len(times))]
-
-    times_pub_BehaviorPlanner = with_colour(times_pub_BehaviorPlanner, False)
-    times_sub_LanePlanner = with_colour(times_sub_LanePlanner, True)
-    times_sub_ParkingPlanner = with_colour(times_sub_ParkingPlanner, True)
-    times_sub_Lanelet2MapLoader = with_colour(times_sub_Lanelet2MapLoader, True)
-    times_sub_Lanelet2GlobalPlanner = with_colour(times_sub_Lanelet2GlobalPlanner, True)
-    times_sub_NDTLocalizer = with_colour(times_sub_NDTLocalizer, True)
-    times_sub_ObjectCollisionEstimator = with_colour(times_sub_ObjectCollisionEstimator, True)
+        periods = get_timer_periods(times, deadlines, pre)
+        assert (periods >= 0).all(), 'should have a matching colour'
+        return colours[periods]
 
     fig, ax = plt.subplots(1, 1, constrained_layout=True)
 
     # Order on Y axis: first->last == bottom->top
-    add_markers_to_axis(ax, 'pub.', times_pub_BehaviorPlanner)
-    add_ranges_to_axis(ax, 'timer', ranges_timer_BehaviorPlanner)
-    add_markers_to_axis(ax, 'sub. 6', times_sub_LanePlanner)
-    add_markers_to_axis(ax, 'sub. 5', times_sub_ParkingPlanner)
-    add_markers_to_axis(ax, 'sub. 4', times_sub_Lanelet2MapLoader)
-    add_markers_to_axis(ax, 'sub. 3', times_sub_Lanelet2GlobalPlanner)
-    add_markers_to_axis(ax, 'sub. 2', times_sub_NDTLocalizer)
-    add_markers_to_axis(ax, 'sub. 1', times_sub_ObjectCollisionEstimator)
+    for i, times_pub in enumerate(times_pubs):
+        label = 'pub.' if 1 == len(times_pubs) else f'pub. {i + 1}'
+        add_markers_to_axis(ax, label, times_pub, get_colours(times_pub, False))
+    add_ranges_to_axis(ax, 'timer', ranges_timer, colours)
+    for i, times_sub in reversed(list(enumerate(times_subs))):
+        add_markers_to_axis(ax, f'sub. {i + 1}', times_sub, get_colours(times_sub, True))
 
     ax.grid()
     if include_plot_title:
         ax.set_title(title)
     ax.set_xlabel(xlabel)
 
-    filename = f'{trace_name}/{name}'
-    fig.savefig(f'{filename}.png')
-    fig.savefig(f'{filename}.svg')
-    fig.savefig(f'{filename}.pdf')
-
+    if trace_dir is not None:
+        wait_for_exports(save_figure(fig, f'{trace_dir}/{name}', export))
+    return fig
+
+
+def get_node_file_suffix(node_name: str) -> str:
+    """Get suffix for the names of the files of a node, e.g., '_ns_node' for '/ns/node'."""
+    return '_' + node_name.strip('/').replace('/', '_')
+
+
+def write_table(df: pd.DataFrame, path: str, table_format: str) -> str:
+    """
+    Write table to a file.
+
+    :param df: the table
+    :param path: the path of the file without extension
+    :param table_format: the file format, 'csv', 'json', or 'parquet' (requires pyarrow)
+    :return: the path of the file
+    """
+    path = f'{path}.{table_format}'
+    if 'csv' == table_format:
+        df.to_csv(path, index=False)
+    elif 'json' == table_format:
+        df.to_json(path, orient='records')
+    elif 'parquet' == table_format:
+        df.to_parquet(path, index=False)
+    else:
+        assert False, f'unknown table_format value: {table_format}'
+    return path
+
+
+def write_metrics(
+    session: TraceSession,
+    timings: Dict[str, NodeTimings],
+    suffixes: Dict[str, str],
+    metrics_format: str,
+) -> None:
+    """
+    Write numeric results instead of plots.
+
+    The period & duration summary of every callback is written to `callback_summary.<format>`, and the timer
+    callback instances of every node, with their interval & duration, are written to `timer_metrics<suffix>.<format>`,
+    under the trace directory.
+
+    :param session: the trace session
+    :param timings: the node timings
+    :param suffixes: the suffix for the names of the files of every node
+    :param metrics_format: the file format, see `write_table()`
+    """
+    paths = [write_table(
+        get_callback_summary(session), os.path.join(session.trace_dir, 'callback_summary'), metrics_format)]
+    for node_name, node_timings in timings.items():
+        timer_metrics = pd.concat(
+            [
+                pd.DataFrame({
+                    'callback_object': timer_obj,
+                    'timestamp': ranges.begins,
+                    'interval_ms': np.concatenate(([np.nan], ranges.intervals() / 1e6)),
+                    'duration_ms': ranges.durations / 1e6,
+                })
+                for timer_obj, ranges in node_timings.timers.items()
+            ] or [pd.DataFrame(columns=['callback_object', 'timestamp', 'interval_ms', 'duration_ms'])],
+            ignore_index=True,
+        )
+        paths.append(write_table(
+            timer_metrics, os.path.join(session.trace_dir, f'timer_metrics{suffixes[node_name]}'), metrics_format))
+    print(f"Metrics: {', '.join(paths)}")
+
+
+def plot_node(
+    timings: NodeTimings,
+    trace_dir: str,
+    suffix: str = '',
+    max_points: Optional[int] = None,
+    export: ExportSettings = ExportSettings(),
+    profiler: Optional[StageProfiler] = None,
+) -> List[Future]:
+    """
+    Plot timer callback interval & duration and time chart for a node.
+
+    :param timings: the node timings, which must include exactly 1 timer
+    :param trace_dir: the path to the directory under which the plot files are written
+    :param suffix: the suffix for the names of the plot files
+    :param max_points: the maximum number of points of the timer plot series, or `None` to plot all points
+    :param export: the settings of the plot files
+    :param profiler: the profiler of the export stages, or `None`
+    :return: the futures of the plot files being written, see `save_figure()`
+    """
+    if 1 != len(timings.timers):
+        print(f"Node '{timings.name}' has {len(timings.timers)} timers, not plotting (need exactly 1)")
+        return []
+    (timer_obj, ranges_timer), = timings.timers.items()
+    print(f"Timer for node '{timings.name}': 0x{timer_obj:x}")
+    if 2 > len(ranges_timer):
+        print(f"Node '{timings.name}' has fewer than 2 timer callback instances, not plotting")
+        return []
+
+    # Plot timer period and callback duration
+    fig = plot_timer(ranges_timer, None, max_points=max_points)
+    futures = save_figure(fig, f'{trace_dir}/5_analysis_timer{suffix}', export, profiler)
 
-def main(argv=sys.argv[1:]) -> int:
-    """Plot analyss results for given trace."""
-    if len(argv) != 1:
-        print('error: must provide only 1 argument: name of directory containing trace')
-        return 1
-    global trace_name
-    trace_name = argv[0].strip('/')
-    print(f'Trace directory: {trace_name}')
+    # Plot pub/sub/timer time chart
+    fig = plot_chart(
+        [ranges.begins for ranges in timings.subscriptions.values()],
+        ranges_timer,
+        list(timings.publishers.values()),
+        None,
+    )
+    futures.extend(save_figure(fig, f'{trace_dir}/5_analysis_time_chart{suffix}', export, profiler))
+    return futures
+
+
+def analyze_trace(
+    trace_dir: str,
+    use_cache: bool = True,
+    node_names: Optional[List[str]] = None,
+    chains: bool = False,
+    kernel: bool = False,
+    report: bool = False,
+    report_top: int = 5,
+    report_threshold: Optional[float] = None,
+    concurrency: bool = False,
+    metrics_format: Optional[str] = None,
+    event_filter: Optional[EventFilter] = None,
+    overview: Optional[int] = None,
+    export: ExportSettings = ExportSettings(),
+    profiler: Optional[StageProfiler] = None,
+) -> TraceSession:
+    """
+    Process trace, analyze it, and plot results.
+
+    :param trace_dir: the path to the directory containing the trace
+    :param use_cache: whether to use the cache for processed data
+    :param node_names: the names of the nodes to analyze, ['all'] for all nodes,
+        or `None` for the BehaviorPlanner node only (with the original plot file names)
+    :param chains: whether to also compute the end-to-end latencies of all chains
+    :param kernel: whether to also analyze callback instances with the kernel trace
+    :param report: whether to also write the outlier report, with kernel data if `kernel` is set
+    :param report_top: the maximum number of outliers per timer and metric in the outlier report
+    :param report_threshold: the value (ms) above which intervals and durations are outliers,
+        or `None` for the largest values only
+    :param concurrency: whether to also analyze the thread utilization, concurrency, and queueing delays,
+        see `analyze_concurrency()`
+    :param metrics_format: the format of the metrics files written instead of plots, see `write_metrics()`,
+        or `None` to plot results
+    :param event_filter: the filter applied while reading the trace, see `load_data_model()`,
+        or `None` to process all events
+    :param overview: the maximum number of points of the timer plot series, or `None` to plot all points
+    :param export: the settings of the plot files
+    :param profiler: the profiler of the analysis stages, or `None`
+    :return: the trace session
+    """
+    trace_dir = trace_dir.rstrip('/')
+    print(f'Trace directory: {trace_dir}')
 
     # Process
-    path = f'{trace_name}/ust'
-    events = load_file(path)
-    handler = Ros2Handler.process(events)
-    global data_util
-    data_util = Ros2DataModelUtil(handler.data)
-    global callback_symbols
-    callback_symbols = data_util.get_callback_symbols()
-    # data_util.data.print_data()
+    session = TraceSession.load(trace_dir, use_cache, event_filter, profiler)
+    # session.data_util.data.print_data()
 
     # Analyze
-    # The BehaviorPlanner node is a cyclic type node with 6 input topics, 1 periodic callback, and 1 output topic
-    # See: https://github.com/ros-realtime/reference-system/blob/6baa1d0d0061ad901cc08e559d8e6acdb169c18b/autoware_reference_system/include/autoware_reference_system/autoware_system_builder.hpp#L193-L203  # noqa: E501
-    times_sub_ObjectCollisionEstimator = get_sub_callback_times('/ObjectCollisionEstimator', 'BehaviorPlanner')
-    times_sub_NDTLocalizer = get_sub_callback_times('/NDTLocalizer', 'BehaviorPlanner')
-    times_sub_Lanelet2GlobalPlanner = get_sub_callback_times('/Lanelet2GlobalPlanner', 'BehaviorPlanner')
-    times_sub_Lanelet2MapLoader = get_sub_callback_times('/Lanelet2MapLoader', 'BehaviorPlanner')
-    times_sub_ParkingPlanner = get_sub_callback_times('/ParkingPlanner', 'BehaviorPlanner')
-    times_sub_LanePlanner = get_sub_callback_times('/LanePlanner', 'BehaviorPlanner')
-    ranges_timer_BehaviorPlanner = get_timer_callback_ranges('BehaviorPlanner')
-    times_pub_BehaviorPlanner = get_publish_times('/BehaviorPlanner')
+    if node_names is None:
+        # The BehaviorPlanner node is a cyclic type node with 6 input topics, 1 periodic callback, and 1 output topic
+        # See: https://github.com/ros-realtime/reference-system/blob/6baa1d0d0061ad901cc08e559d8e6acdb169c18b/autoware_reference_system/include/autoware_reference_system/autoware_system_builder.hpp#L193-L203  # noqa: E501
+        node_names_to_get = ['/BehaviorPlanner']
+        suffixes = {'/BehaviorPlanner': ''}
+    else:
+        node_names_to_get = None if 'all' in node_names else node_names
+        suffixes = None
+    with get_stage(profiler, 'get_node_timings') as stage:
+        timings = session.get_node_timings(node_names_to_get)
+        data = session.data_util.data
+        stage['rows'] = len(data.callback_instances) + len(data.rcl_publish_instances)
+    if suffixes is None:
+        suffixes = {node_name: get_node_file_suffix(node_name) for node_name in timings}
+    if chains:
+        with get_stage(profiler, 'get_chain_summary') as stage:
+            chain_summary = get_chain_summary(session, get_chains(session))
+            stage['rows'] = len(chain_summary)
+        chain_summary_path = os.path.join(trace_dir, 'chain_latencies.csv')
+        chain_summary.to_csv(chain_summary_path, index=False)
+        print(f'End-to-end latencies of {len(chain_summary)} chains: {chain_summary_path}')
+    kernel_intervals = None
+    if kernel:
+        with get_stage(profiler, 'get_kernel_intervals') as stage:
+            kernel_intervals = get_kernel_intervals(trace_dir)
+            stage['rows'] = len(kernel_intervals[0]) + len(kernel_intervals[1])
+        with get_stage(profiler, 'analyze_kernel') as stage:
+            stage['rows'] = len(analyze_kernel(session, kernel_intervals[0]))
+    if report:
+        with get_stage(profiler, 'outlier_report') as stage:
+            outlier_report = get_outlier_report(
+                session, report_top, report_threshold, kernel_intervals=kernel_intervals)
+            write_outlier_report(outlier_report, trace_dir)
+            stage['rows'] = len(outlier_report)
+    if concurrency:
+        with get_stage(profiler, 'analyze_concurrency') as stage:
+            analyze_concurrency(session)
+            stage['rows'] = len(session.data_util.data.callback_instances)
+
+    if metrics_format is not None:
+        with get_stage(profiler, 'write_metrics'):
+            write_metrics(session, timings, suffixes, metrics_format)
+        return session
 
     # Plot
+    import matplotlib.pyplot as plt
     plt.rc('text', usetex=True)
     plt.rc('font', family='serif', size=14)
     plt.rc('axes', titlesize=20)
 
-    # Plot BehaviorPlanner timer period and callback duration
-    plot_timer(ranges_timer_BehaviorPlanner)
+    futures = []
+    for node_name, node_timings in timings.items():
+        with get_stage(profiler, 'plot_node') as stage:
+            futures.extend(plot_node(node_timings, trace_dir, suffixes[node_name], overview, export, profiler))
+            stage['rows'] = sum(len(ranges) for ranges in node_timings.timers.values())
+    wait_for_exports(futures, profiler)
+    return session
+
+
+def estimate_memory(trace_dir: str) -> int:
+    """
+    Estimate the memory needed to analyze a trace.
+
+    :param trace_dir: the path to the directory containing the trace
+    :return: the estimated memory (bytes)
+    """
+    def get_size(path: str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(root, file))
+            for root, _, files in os.walk(path)
+            for file in files
+        )
 
-    # Plot pub/sub/timer time chart
-    plot_chart(
-        times_sub_ObjectCollisionEstimator,
-        times_sub_NDTLocalizer,
-        times_sub_Lanelet2GlobalPlanner,
-        times_sub_Lanelet2MapLoader,
-        times_sub_ParkingPlanner,
-        times_sub_LanePlanner,
-        ranges_timer_BehaviorPlanner,
-        times_pub_BehaviorPlanner,
-    )
+    # Processed data takes roughly a few times the size of the cached data,
+    # and an order of magnitude more than the size of the CTF trace
+    cache_dir = os.path.join(trace_dir, cache_dir_name)
+    if os.path.isdir(cache_dir):
+        return 3 * get_size(cache_dir)
+    return 10 * get_size(os.path.join(trace_dir, 'ust'))
+
+
+def get_available_memory() -> int:
+    """
+    Get available physical memory (bytes).
+
+    On Linux, this is `MemAvailable` from `/proc/meminfo`, which includes reclaimable memory like the page cache,
+    e.g., after reading large traces. Otherwise, this is only the free memory.
+    """
+    with contextlib.suppress(OSError, ValueError):
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    # In kB
+                    return int(line.split()[1]) * 1024
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+
+
+def _init_batch_worker(metrics_format: Optional[str]) -> None:
+    # Workers only write plots to files
+    if metrics_format is None:
+        import matplotlib.pyplot as plt
+        plt.switch_backend('agg')
+
+
+def _analyze_trace_worker(
+    trace_dir: str,
+    use_cache: bool,
+    node_names: Optional[List[str]],
+    chains: bool,
+    kernel: bool,
+    report: bool,
+    report_top: int,
+    report_threshold: Optional[float],
+    concurrency: bool,
+    metrics_format: Optional[str],
+    event_filter: Optional[EventFilter],
+    overview: Optional[int],
+    export: ExportSettings,
+) -> Tuple[pd.DataFrame, Dict[Tuple, QuantileSketch]]:
+    session = analyze_trace(
+        trace_dir, use_cache, node_names, chains, kernel, report, report_top, report_threshold, concurrency,
+        metrics_format, event_filter, overview, export)
+    if metrics_format is None:
+        import matplotlib.pyplot as plt
+        plt.close('all')
+    return get_callback_summary(session), get_callback_sketches(session)
+
+
+def analyze_traces(
+    trace_dirs: List[str],
+    jobs: int,
+    memory_limit: int,
+    use_cache: bool = True,
+    node_names: Optional[List[str]] = None,
+    chains: bool = False,
+    kernel: bool = False,
+    report: bool = False,
+    report_top: int = 5,
+    report_threshold: Optional[float] = None,
+    concurrency: bool = False,
+    metrics_format: Optional[str] = None,
+    event_filter: Optional[EventFilter] = None,
+    overview: Optional[int] = None,
+    export: ExportSettings = ExportSettings(),
+) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """
+    Analyze traces in parallel and summarize results.
+
+    Traces are analyzed in a process pool, largest first. A trace is only started if the estimated memory
+    of all traces being analyzed stays below the memory limit, unless no other trace is being analyzed.
+
+    :param trace_dirs: the paths to the directories containing the traces
+    :param jobs: the maximum number of traces to analyze in parallel
+    :param memory_limit: the memory limit (bytes)
+    :param use_cache: whether to use the cache for processed data
+    :param node_names: the names of the nodes to plot, see `analyze_trace()`
+    :param chains: whether to also compute the end-to-end latencies of all chains for every trace
+    :param kernel: whether to also analyze callback instances with the kernel trace for every trace
+    :param report: whether to also write the outlier report for every trace, see `analyze_trace()`
+    :param report_top: the maximum number of outliers per timer and metric in the outlier report
+    :param report_threshold: the value (ms) above which intervals and durations are outliers
+    :param concurrency: whether to also analyze the thread utilization, concurrency, and queueing delays
+        for every trace
+    :param metrics_format: the format of the metrics files written instead of plots for every trace,
+        or `None` to plot results, see `analyze_trace()`
+    :param event_filter: the filter applied while reading every trace, or `None` to process all events
+    :param overview: the maximum number of points of the timer plot series, or `None` to plot all points
+    :param export: the settings of the plot files of every trace
+    :return: the callback summary of all traces, with a trace column, the period and duration
+        percentiles over all traces, computed by merging the sketches of every trace, and the traces
+        that could not be analyzed
+    """
+    estimates = {trace_dir: estimate_memory(trace_dir) for trace_dir in trace_dirs}
+    pending = sorted(trace_dirs, key=estimates.get, reverse=True)
+    running = {}
+    summaries = []
+    sketches = {}
+    failed = []
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_batch_worker,
+        initargs=(metrics_format,),
+    ) as executor:
+        while pending or running:
+            memory = sum(estimates[trace_dir] for trace_dir in running.values())
+            for trace_dir in list(pending):
+                if len(running) >= jobs:
+                    break
+                if running and memory + estimates[trace_dir] > memory_limit:
+                    continue
+                pending.remove(trace_dir)
+                running[executor.submit(
+                    _analyze_trace_worker, trace_dir, use_cache, node_names, chains, kernel,
+                    report, report_top, report_threshold, concurrency, metrics_format, event_filter,
+                    overview, export)] = trace_dir
+                memory += estimates[trace_dir]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trace_dir = running.pop(future)
+                try:
+                    summary, trace_sketches = future.result()
+                except Exception as e:
+                    print(f'error: failed to analyze trace {trace_dir}: {e}')
+                    failed.append(trace_dir)
+                    continue
+                summary.insert(0, 'trace', trace_dir)
+                summaries.append(summary)
+                for key, sketch in trace_sketches.items():
+                    if key in sketches:
+                        sketches[key].merge(sketch)
+                    else:
+                        sketches[key] = sketch
+    merged_summary = get_sketch_summary(sketches, ['node', 'topic', 'kind', 'metric'])
+    if not summaries:
+        return pd.DataFrame(), merged_summary, sorted(failed)
+    summary = pd.concat(summaries, ignore_index=True).sort_values(['trace', 'node', 'kind'], ignore_index=True)
+    return summary, merged_summary, sorted(failed)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Plot analysis results for given trace(s), see README.')
+    parser.add_argument(
+        'trace_dirs', nargs='+', metavar='trace_dir',
+        help='the path to the directory containing the trace, or glob pattern; '
+             'multiple traces are analyzed in batch mode')
+    parser.add_argument(
+        '--no-cache', dest='use_cache', action='store_false',
+        help='process the trace even if cached data is available, and do not cache it (default: use cache)')
+    parser.add_argument(
+        '--node', dest='node_names', metavar='NODE', action='append',
+        help="name of a node to analyze (can be repeated), or 'all' for all nodes; "
+             'plots are only created for nodes with 1 timer (default: /BehaviorPlanner)')
+    parser.add_argument(
+        '--chains', action='store_true',
+        help='compute the end-to-end latencies of all chains of nodes from sources to sinks, '
+             'and write them to chain_latencies.csv under the trace directory')
+    parser.add_argument(
+        '--kernel', action='store_true',
+        help='compute the on-CPU, preempted, and wakeup latency time of every callback instance using the '
+             'kernel trace, and write them to callback_kernel_stats.csv under the trace directory')
+    parser.add_argument(
+        '--report', action='store_true',
+        help='find the largest intervals and durations of every timer callback and what happened around them '
+             '(other callbacks on the same thread, and, with --kernel, preemptions, wakeup latencies, and IRQs), '
+             'and write them to outlier_report.json and outlier_report.html under the trace directory')
+    parser.add_argument(
+        '--report-top', metavar='K', type=int, default=5,
+        help='maximum number of outliers per timer and metric in the outlier report (default: %(default)s)')
+    parser.add_argument(
+        '--report-threshold', metavar='MS', type=float,
+        help='only report intervals and durations above MS milliseconds (default: largest values only)')
+    parser.add_argument(
+        '--start', metavar='S', type=float,
+        help='only process events after S seconds from the beginning of the trace; '
+             'events that define nodes, publishers, callbacks, etc. are always processed (default: beginning)')
+    parser.add_argument(
+        '--end', metavar='S', type=float,
+        help='only process events until S seconds from the beginning of the trace (default: end)')
+    parser.add_argument(
+        '--events', dest='event_names', metavar='NAMES', type=lambda names: set(names.split(',')),
+        help='comma-separated names of the events to process, e.g., ros2:callback_start,ros2:callback_end; '
+             'events that define nodes, publishers, callbacks, etc. are always processed (default: all events)')
+    parser.add_argument(
+        '--handles', metavar='HANDLES', type=lambda handles: {int(handle, 0) for handle in handles.split(',')},
+        help='comma-separated callback objects and publisher handles, e.g., 0x013579acdf, of the callback and '
+             'publish events to process (default: all)')
+    parser.add_argument(
+        '--overview', metavar='POINTS', type=int,
+        help='plot at most POINTS points per timer callback interval and duration series, keeping the minimum '
+             'and maximum values of consecutive callback instances; statistics still use all values')
+    parser.add_argument(
+        '--concurrency', action='store_true',
+        help='compute the busy time of every thread that executed callbacks, the number of callbacks running in '
+             'parallel over time, and the queueing delay of subscription callbacks, e.g., for multithreaded '
+             'executors, and write them under the trace directory')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='print the wall time, CPU time, peak RSS, and number of rows of every analysis stage')
+    parser.add_argument(
+        '--profile-json', metavar='PATH',
+        help='write the profile of every analysis stage to a JSON file (implies --profile)')
+    parser.add_argument(
+        '--cprofile', metavar='PATH',
+        help='profile the analysis with cProfile and write the stats to a file, e.g., for pstats or snakeviz')
+    parser.add_argument(
+        '--metrics-only', action='store_true',
+        help='do not plot results (matplotlib and LaTeX are not needed), and write the callback summary '
+             'and timer callback intervals & durations under the trace directory instead')
+    parser.add_argument(
+        '--metrics-format', choices=['csv', 'json', 'parquet'], default='csv',
+        help='format of the metrics files in metrics-only mode; parquet requires pyarrow (default: %(default)s)')
+    parser.add_argument(
+        '--formats', type=lambda formats: formats.split(','), default=list(ExportSettings().formats),
+        help='comma-separated formats of the plot files (default: %(default)s)')
+    parser.add_argument(
+        '--export-jobs', type=int, default=ExportSettings().jobs,
+        help='number of processes used to write plot files in parallel (default: %(default)s)')
+    parser.add_argument(
+        '--stream', metavar='WINDOW', type=float,
+        help='process the trace in streaming mode with bounded memory, '
+             'writing callback duration & interval and publish latency statistics for every WINDOW seconds')
+    parser.add_argument(
+        '--live', action='store_true',
+        help='analyze the trace while it is being written, with trace_dir being either an LTTng live URL '
+             '(net://...) or the output directory of a tracing session with rotation enabled, and show '
+             'rolling callback duration & interval and publish latency percentiles and timer deadline misses')
+    parser.add_argument(
+        '--live-samples', metavar='N', type=int, default=1000,
+        help='number of most recent samples used for rolling percentiles in live mode (default: %(default)s)')
+    parser.add_argument(
+        '--update-interval', metavar='S', type=float, default=1.0,
+        help='time between updates in live mode (default: %(default)s)')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count(),
+        help='maximum number of traces to analyze in parallel in batch mode (default: %(default)s)')
+    parser.add_argument(
+        '--memory-limit', metavar='GB', type=float,
+        help='memory limit for traces analyzed in parallel in batch mode (default: available memory)')
+    parser.add_argument(
+        '--summary', default='summary.csv',
+        help='path of the summary table written in batch mode (default: %(default)s)')
+    parser.add_argument(
+        '--merged-summary', default='merged_summary.csv',
+        help='path of the table of period & duration percentiles over all traces written in batch mode '
+             '(default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def write_profile(profiler: StageProfiler, path: Optional[str]) -> None:
+    """
+    Print profile of analysis stages and optionally write it to a file.
+
+    :param profiler: the profiler of the analysis stages
+    :param path: the path of the JSON file with the records and summary of all stages, or `None`
+    """
+    summary = profiler.get_summary()
+    print(summary.to_string(index=False, float_format='{:.3f}'.format))
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(
+                {
+                    'records': profiler.records,
+                    'summary': json.loads(summary.to_json(orient='records')),
+                },
+                f,
+                indent=2,
+            )
+        print(f'Profile: {path}')
+
+
+def run(
+    args: argparse.Namespace,
+    export: ExportSettings = ExportSettings(),
+    profiler: Optional[StageProfiler] = None,
+) -> int:
+    """
+    Run analysis for parsed command-line arguments.
+
+    :param args: the parsed command-line arguments
+    :param export: the settings of the plot files
+    :param profiler: the profiler of the analysis stages, or `None`
+    :return: the exit code
+    """
+    metrics_format = args.metrics_format if args.metrics_only else None
+    event_filter = None
+    if any(value is not None for value in (args.start, args.end, args.event_names, args.handles)):
+        event_filter = EventFilter(args.start, args.end, args.event_names, args.handles)
+    trace_dirs = []
+    for trace_dir in args.trace_dirs:
+        is_pattern = any(c in trace_dir for c in '*?[')
+        trace_dirs.extend(sorted(glob.glob(trace_dir)) if is_pattern else [trace_dir])
+    if not trace_dirs:
+        print('error: no trace directory matches the given pattern(s)')
+        return 1
 
-    plt.show()
+    if 1 < len(trace_dirs):
+        if args.stream is not None or args.live:
+            print('error: streaming and live modes only support 1 trace')
+            return 1
+        memory_limit = int(args.memory_limit * 1e9) if args.memory_limit is not None else get_available_memory()
+        with get_stage(profiler, 'analyze_traces') as stage:
+            summary, merged_summary, failed = analyze_traces(
+                trace_dirs, args.jobs, memory_limit, args.use_cache, args.node_names, args.chains, args.kernel,
+                args.report, args.report_top, args.report_threshold, args.concurrency, metrics_format,
+                event_filter, args.overview, export)
+            stage['rows'] = len(trace_dirs)
+        summary.to_csv(args.summary, index=False)
+        print(f'Summary of {len(trace_dirs)} traces: {args.summary}')
+        merged_summary.to_csv(args.merged_summary, index=False)
+        print(f'Percentiles over all traces: {args.merged_summary}')
+        if failed:
+            print(f"error: failed to analyze {len(failed)} of {len(trace_dirs)} traces: {', '.join(failed)}")
+            return 1
+        return 0
+
+    if args.live:
+        print(f'Live source: {trace_dirs[0]}')
+        analyze_live(trace_dirs[0], args.live_samples, args.update_interval)
+        return 0
+
+    if args.stream is not None:
+        trace_dir = trace_dirs[0].rstrip('/')
+        print(f'Trace directory: {trace_dir}')
+        with get_stage(profiler, 'analyze_stream'):
+            analyze_stream(trace_dir, args.stream, event_filter)
+        return 0
+
+    analyze_trace(
+        trace_dirs[0], args.use_cache, args.node_names, args.chains, args.kernel,
+        args.report, args.report_top, args.report_threshold, args.concurrency, metrics_format,
+        event_filter, args.overview, export, profiler)
+    if metrics_format is None:
+        # Only this mode plots
+        import matplotlib.pyplot as plt
+        plt.show()
 
     return 0
 
 
+def main(argv=sys.argv[1:]) -> int:
+    """Plot analyss results for given trace."""
+    args = parse_args(argv)
+    export = ExportSettings(tuple(args.formats), args.export_jobs)
+    profiler = None
+    if args.profile or args.profile_json is not None:
+        profiler = StageProfiler()
+    cprofile = cProfile.Profile() if args.cprofile is not None else None
+    if cprofile is not None:
+        cprofile.enable()
+    try:
+        ret = run(args, export, profiler)
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(args.cprofile)
+            print(f'cProfile stats: {args.cprofile}')
+        if profiler is not None:
+            write_profile(profiler, args.profile_json)
+    return ret
+
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -0,0 +1,310 @@
+# Copyright 2021 Christophe Bedard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of the analysis script using synthetic trace data, see README."""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import matplotlib.pyplot as plt
+
+import numpy as np
+
+import pandas as pd
+
+import analyze
+
+
+# Events per timer period and node: timer callback start & end, rclcpp/rcl/rmw publish,
+# and subscription callback start & end in the next node
+events_per_period = 7
+timer_period = 100_000_000
+start_time = 1_600_000_000_000_000_000
+# Only write PNG plot files
+plot_export = analyze.ExportSettings(formats=('png',))
+
+
+def generate_data_model(num_events: int, num_nodes: int = 10, seed: int = 0) -> analyze.Ros2DataModel:
+    """
+    Generate a synthetic data model, as processed by `Ros2Handler`.
+
+    The nodes form a chain: every node has a timer and a publisher, and every node but the first one
+    subscribes to the topic of the previous node. Every timer callback publishes a message, which is
+    received by the next node. Timer periods, callback durations, and publish latencies vary randomly.
+
+    :param num_events: the approximate number of trace events
+    :param num_nodes: the number of nodes
+    :param seed: the seed for the random generator
+    :return: the data model
+    """
+    rng = np.random.default_rng(seed)
+    num_periods = max(2, num_events // (events_per_period * num_nodes))
+    data = analyze.Ros2DataModel()
+
+    node_handles = 0x1000 + np.arange(num_nodes)
+    pub_handles = 0x2000 + np.arange(num_nodes)
+    sub_handles = 0x3000 + np.arange(1, num_nodes)
+    sub_refs = 0x4000 + np.arange(1, num_nodes)
+    timer_handles = 0x5000 + np.arange(num_nodes)
+    timer_callbacks = 0x6000 + np.arange(num_nodes)
+    sub_callbacks = 0x7000 + np.arange(1, num_nodes)
+    tids = 100 + np.arange(num_nodes)
+    topic_names = [f'/node_{i}' for i in range(num_nodes)]
+    zeros = np.zeros(num_nodes, dtype=np.int64)
+
+    data.nodes = pd.DataFrame({
+        'node_handle': node_handles,
+        'timestamp': zeros,
+        'tid': tids,
+        'rmw_handle': node_handles,
+        'name': [f'node_{i}' for i in range(num_nodes)],
+        'namespace': '/',
+    }).set_index('node_handle')
+    data.rcl_publishers = pd.DataFrame({
+        'publisher_handle': pub_handles,
+        'timestamp': zeros,
+        'node_handle': node_handles,
+        'rmw_handle': pub_handles,
+        'topic_name': topic_names,
+        'depth': 10,
+    }).set_index('publisher_handle')
+    data.rcl_subscriptions = pd.DataFrame({
+        'subscription_handle': sub_handles,
+        'timestamp': zeros[1:],
+        'node_handle': node_handles[1:],
+        'rmw_handle': sub_handles,
+        'topic_name': topic_names[:-1],
+        'depth': 10,
+    }).set_index('subscription_handle')
+    data.subscription_objects = pd.DataFrame({
+        'subscription': sub_refs,
+        'timestamp': zeros[1:],
+        'subscription_handle': sub_handles,
+    }).set_index('subscription')
+    data.timers = pd.DataFrame({
+        'timer_handle': timer_handles,
+        'timestamp': zeros,
+        'period': timer_period,
+        'tid': tids,
+    }).set_index('timer_handle')
+    data.timer_node_links = pd.DataFrame({
+        'timer_handle': timer_handles,
+        'timestamp': zeros,
+        'node_handle': node_handles,
+    }).set_index('timer_handle')
+    data.callback_objects = pd.DataFrame({
+        'reference': np.concatenate((timer_handles, sub_refs)),
+        'timestamp': np.zeros(2 * num_nodes - 1, dtype=np.int64),
+        'callback_object': np.concatenate((timer_callbacks, sub_callbacks)),
+    }).set_index('reference')
+    data.callback_symbols = pd.DataFrame({
+        'callback_object': np.concatenate((timer_callbacks, sub_callbacks)),
+        'timestamp': np.zeros(2 * num_nodes - 1, dtype=np.int64),
+        'symbol': [f'timer_callback_{i}' for i in range(num_nodes)]
+        + [f'subscription_callback_{i}' for i in range(1, num_nodes)],
+    }).set_index('callback_object')
+
+    # Timer callback instances, for every (period, node)
+    shape = (num_periods, num_nodes)
+    timer_begins = (
+        start_time
+        + np.arange(num_periods)[:, None] * timer_period
+        + np.arange(num_nodes)[None, :] * (timer_period // num_nodes)
+        + rng.integers(0, timer_period // 20, shape)
+    )
+    timer_durations = rng.integers(500_000, 3_000_000, shape)
+    # Publish in the middle of the callback, going through rclcpp, rcl, and rmw
+    rclcpp_times = timer_begins + timer_durations // 2
+    rcl_times = rclcpp_times + rng.integers(1_000, 5_000, shape)
+    rmw_times = rcl_times + rng.integers(1_000, 5_000, shape)
+    messages = 0x10_0000_0000 + np.arange(num_periods * num_nodes).reshape(shape)
+    # Subscription callback instances in the next node
+    sub_begins = rmw_times[:, :-1] + rng.integers(50_000, 500_000, (num_periods, num_nodes - 1))
+    sub_durations = rng.integers(100_000, 300_000, (num_periods, num_nodes - 1))
+
+    callback_instances = pd.DataFrame({
+        'callback_object': np.concatenate((
+            np.broadcast_to(timer_callbacks, shape).ravel(),
+            np.broadcast_to(sub_callbacks, sub_begins.shape).ravel(),
+        )),
+        'timestamp': np.concatenate((timer_begins.ravel(), sub_begins.ravel())),
+        'duration': np.concatenate((timer_durations.ravel(), sub_durations.ravel())),
+        'intra_process': False,
+        'tid': np.concatenate((
+            np.broadcast_to(tids, shape).ravel(),
+            np.broadcast_to(tids[1:], sub_begins.shape).ravel(),
+        )),
+    })
+    data.callback_instances = callback_instances.sort_values('timestamp', ignore_index=True)
+    data.rclcpp_publish_instances = pd.DataFrame({
+        'timestamp': rclcpp_times.ravel(),
+        'message': messages.ravel(),
+    })
+    data.rcl_publish_instances = pd.DataFrame({
+        'timestamp': rcl_times.ravel(),
+        'publisher_handle': np.broadcast_to(pub_handles, shape).ravel(),
+        'message': messages.ravel(),
+    })
+    data.rmw_publish_instances = pd.DataFrame({
+        'timestamp': rmw_times.ravel(),
+        'message': messages.ravel(),
+    })
+    return data
+
+
+def measure(function: Callable[[], None], repeat: int) -> Tuple[float, int]:
+    """
+    Measure the wall time and peak memory of a function.
+
+    The function is run `repeat` times to get the lowest wall time, and then one more time
+    while tracing memory allocations to get the peak memory.
+
+    :param function: the function
+    :param repeat: the number of runs for the wall time
+    :return: the wall time (s) and the peak memory (bytes)
+    """
+    wall_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        wall_times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(wall_times), peak_memory
+
+
+def get_benchmarks(data: analyze.Ros2DataModel, trace_dir: str) -> Dict[str, Callable[[], None]]:
+    """
+    Get benchmarks of the analysis steps for a data model.
+
+    Every benchmark runs a step from scratch in a new session, i.e., without the results cached by
+    previous steps, but with the inputs of the step computed beforehand.
+
+    :param data: the data model
+    :param trace_dir: the path to the directory under which plot files are written
+    :return: the benchmark functions, by step name
+    """
+    node_name = '/node_1'
+    timings = analyze.TraceSession(trace_dir, data).get_node_timings([node_name])[node_name]
+    (_, ranges_timer), = timings.timers.items()
+    times_lists = [ranges.begins for ranges in timings.subscriptions.values()] + list(timings.publishers.values())
+
+    def publish_times() -> None:
+        analyze.TraceSession(trace_dir, data).get_publish_times('/node_1')
+
+    def callback_ranges() -> None:
+        analyze.TraceSession(trace_dir, data).get_timer_callback_ranges(node_name)
+
+    def node_timings() -> None:
+        analyze.TraceSession(trace_dir, data).get_node_timings()
+
+    def intervals() -> None:
+        analyze.get_intervals(ranges_timer)
+        analyze.get_begins_durations(ranges_timer)
+
+    def relative_ms() -> None:
+        analyze.to_relative_ms(times_lists, [ranges_timer], 6.0)
+
+    def plot() -> None:
+        analyze.wait_for_exports(analyze.plot_node(timings, trace_dir, export=plot_export))
+        plt.close('all')
+
+    return {
+        'get_publish_times': publish_times,
+        'get_timer_callback_ranges': callback_ranges,
+        'get_node_timings': node_timings,
+        'get_intervals': intervals,
+        'to_relative_ms': relative_ms,
+        'plot_node': plot,
+    }
+
+
+def run_benchmarks(sizes: List[int], repeat: int, plot_max_size: int) -> pd.DataFrame:
+    """
+    Run benchmarks for synthetic data models of different sizes.
+
+    :param sizes: the approximate numbers of trace events
+    :param repeat: the number of runs of every benchmark for the wall time
+    :param plot_max_size: the maximum number of trace events for the plotting benchmark
+    :return: the results, with one row per (size, step)
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as trace_dir:
+        for size in sizes:
+            start = time.perf_counter()
+            data = generate_data_model(size)
+            print(f'Generated data model with ~{size} events in {time.perf_counter() - start:.3f} s')
+            benchmarks = get_benchmarks(data, trace_dir)
+            for step, function in benchmarks.items():
+                if 'plot_node' == step and size > plot_max_size:
+                    continue
+                # Hide what the analysis steps print
+                with contextlib.redirect_stdout(io.StringIO()):
+                    wall_time, peak_memory = measure(function, repeat)
+                rows.append({
+                    'events': size,
+                    'callback_instances': len(data.callback_instances),
+                    'step': step,
+                    'wall_time_s': wall_time,
+                    'peak_memory_mb': peak_memory / 1e6,
+                })
+                print(f'  {step}: {wall_time:.4f} s, {peak_memory / 1e6:.1f} MB')
+    return pd.DataFrame(rows)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark analysis steps with synthetic trace data, see README.')
+    parser.add_argument(
+        '--sizes', type=lambda sizes: [int(float(size)) for size in sizes.split(',')],
+        default=[10**3, 10**4, 10**5, 10**6, 10**7],
+        help='comma-separated approximate numbers of trace events (default: 1e3,1e4,1e5,1e6,1e7)')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='number of runs of every benchmark, keeping the lowest wall time (default: %(default)s)')
+    parser.add_argument(
+        '--plot-max-size', type=lambda size: int(float(size)), default=10**6,
+        help='maximum number of trace events for the plotting benchmark (default: 1e6)')
+    parser.add_argument(
+        '--output', default='benchmark.csv',
+        help='path of the results table (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main(argv=sys.argv[1:]) -> int:
+    """Run benchmarks and write results."""
+    args = parse_args(argv)
+    # Only write plot files
+    plt.switch_backend('agg')
+    results = run_benchmarks(args.sizes, args.repeat, args.plot_max_size)
+    results.to_csv(args.output, index=False)
+    print(results.pivot(index='step', columns='events', values='wall_time_s').to_string())
+    print(f'Results: {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
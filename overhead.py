@@ -0,0 +1,247 @@
+# Copyright 2021 Christophe Bedard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measurement of the tracing overhead for the configurations of the launch file, see README."""
+
+import argparse
+import glob
+import os
+import resource
+import subprocess
+import sys
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import pandas as pd
+
+import analyze
+
+
+# Tracing configurations of system.launch.py, from the lowest to the highest expected overhead
+configurations = ['none', 'callbacks', 'ust', 'ust_sched', 'kernel']
+# Configuration without tracing, used as the reference for the CPU time
+cpu_reference_configuration = 'none'
+# Configuration with the fewest events that still give callback durations and timer periods,
+# used as the reference for callback metrics, since they cannot be measured without tracing
+callback_reference_configuration = 'callbacks'
+base_dir = os.path.dirname(os.path.realpath(__file__))
+launch_file = os.path.join(base_dir, 'system.launch.py')
+# Callbacks are matched between runs using these columns, since callback objects are pointers
+callback_key = ['node', 'topic', 'kind']
+callback_metrics = ['count', 'duration_p50_ms', 'duration_p99_ms', 'period_p50_ms', 'period_p99_ms', 'jitter_ms']
+
+
+def get_children_cpu_time() -> float:
+    """Get the total user & system CPU time (s) of the terminated child processes of this process."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_system(configuration: str, run: int, length: float) -> Tuple[Optional[str], float]:
+    """
+    Run the system with a tracing configuration.
+
+    The CPU time of the system is measured from the resource usage of the launch process, which includes
+    the resource usage of the processes it launched, but not the resource usage of the LTTng daemons.
+
+    :param configuration: the tracing configuration
+    :param run: the run number, for the name of the trace
+    :param length: the length of execution (s)
+    :return: the path to the directory containing the trace, or `None` if the configuration does not trace,
+        and the CPU time (s) of the system
+    """
+    session_name = f'overhead-{configuration}-{run}'
+    cpu_time = get_children_cpu_time()
+    subprocess.run(
+        [
+            'ros2', 'launch', launch_file,
+            f'tracing:={configuration}',
+            f'length:={length}',
+            f'session_name:={session_name}',
+        ],
+        check=True,
+    )
+    cpu_time = get_children_cpu_time() - cpu_time
+    trace_dirs = sorted(glob.glob(os.path.join(base_dir, f'{session_name}-*')))
+    if cpu_reference_configuration == configuration:
+        assert not trace_dirs
+        return None, cpu_time
+    assert trace_dirs, f'no trace found for session: {session_name}'
+    # Latest trace, if the directory contains traces from previous measurements
+    return trace_dirs[-1], cpu_time
+
+
+def run_configurations(configurations: List[str], repeat: int, length: float) -> pd.DataFrame:
+    """
+    Run the system with every tracing configuration.
+
+    Runs of the configurations are interleaved, so that changes in the state of the machine over time,
+    e.g., its temperature, affect all configurations similarly.
+
+    :param configurations: the tracing configurations
+    :param repeat: the number of runs of every configuration
+    :param length: the length of execution (s) of every run
+    :return: the runs, with the configuration, run number, trace directory, and CPU time (s) of every run
+    """
+    rows = []
+    for run in range(repeat):
+        for configuration in configurations:
+            print(f'Running system with tracing configuration: {configuration} (run {run + 1}/{repeat})')
+            trace_dir, cpu_time = run_system(configuration, run, length)
+            rows.append({
+                'configuration': configuration,
+                'run': run,
+                'trace_dir': trace_dir,
+                'cpu_time_s': cpu_time,
+            })
+    return pd.DataFrame(rows)
+
+
+def get_trace_size(trace_dir: str) -> int:
+    """Get the size (bytes) of the trace files, excluding the analysis cache."""
+    size = 0
+    for path in ('ust', 'kernel'):
+        for dir_path, _, file_names in os.walk(os.path.join(trace_dir, path)):
+            size += sum(os.path.getsize(os.path.join(dir_path, file_name)) for file_name in file_names)
+    return size
+
+
+def get_callback_metrics(trace_dir: str, use_cache: bool) -> pd.DataFrame:
+    """
+    Get the duration and period metrics of every callback of a trace.
+
+    The jitter of a callback is the difference between the 99th percentile and the median of its periods,
+    which is only meaningful for timer callbacks.
+
+    :param trace_dir: the path to the directory containing the trace
+    :param use_cache: whether to use the cache for processed data, see `analyze.load_data_model()`
+    :return: the metrics, with one row per callback, see `analyze.get_callback_summary()`
+    """
+    session = analyze.TraceSession.load(trace_dir, use_cache)
+    summary = analyze.get_callback_summary(session, percentiles=(50.0, 99.0))
+    summary['jitter_ms'] = summary['period_p99_ms'] - summary['period_p50_ms']
+    return summary
+
+
+def compare_configurations(runs: pd.DataFrame, use_cache: bool) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compare callback metrics and CPU time between tracing configurations.
+
+    Callback metrics are averaged over the runs of a configuration and then compared to the metrics of the
+    same callback with the callback reference configuration. The CPU time is compared to the CPU time without
+    tracing.
+
+    :param runs: the runs, see `run_configurations()`
+    :param use_cache: whether to use the cache for processed data
+    :return: the callback metrics, with one row per (configuration, callback), and the overhead, with one row
+        per configuration
+    """
+    runs = runs.copy()
+    summaries = []
+    trace_sizes = []
+    for row in runs.itertuples():
+        if pd.isna(row.trace_dir):
+            trace_sizes.append(0)
+            continue
+        trace_sizes.append(get_trace_size(row.trace_dir))
+        summary = get_callback_metrics(row.trace_dir, use_cache)
+        summary['configuration'] = row.configuration
+        summaries.append(summary)
+    runs['trace_size_mb'] = [size / 1e6 for size in trace_sizes]
+
+    callbacks = (
+        pd.concat(summaries, ignore_index=True)
+        .groupby(['configuration'] + callback_key, dropna=False, sort=False)[callback_metrics]
+        .mean()
+        .reset_index()
+    )
+    reference = callbacks[callbacks['configuration'] == callback_reference_configuration]
+    callbacks = callbacks.merge(
+        reference[callback_key + callback_metrics], on=callback_key, how='left', suffixes=('', '_reference'))
+    for metric in ('duration_p50_ms', 'duration_p99_ms'):
+        callbacks[metric.replace('_ms', '_change_pct')] = (
+            100.0 * (callbacks[metric] / callbacks[f'{metric}_reference'] - 1.0))
+    callbacks['jitter_change_ms'] = callbacks['jitter_ms'] - callbacks['jitter_ms_reference']
+    callbacks = callbacks.drop(columns=[f'{metric}_reference' for metric in callback_metrics])
+
+    overhead = runs.groupby('configuration', sort=False)[['cpu_time_s', 'trace_size_mb']].mean()
+    if cpu_reference_configuration in overhead.index:
+        cpu_time_reference = overhead.loc[cpu_reference_configuration, 'cpu_time_s']
+        overhead['cpu_time_change_pct'] = 100.0 * (overhead['cpu_time_s'] / cpu_time_reference - 1.0)
+    timers = callbacks[callbacks['kind'] == 'timer']
+    overhead = overhead.join(pd.DataFrame({
+        # Median over callbacks, so that a few callbacks with very short durations do not dominate
+        'duration_p50_change_pct': callbacks.groupby('configuration')['duration_p50_change_pct'].median(),
+        'duration_p99_change_pct': callbacks.groupby('configuration')['duration_p99_change_pct'].median(),
+        'timer_jitter_ms': timers.groupby('configuration')['jitter_ms'].mean(),
+        'timer_jitter_change_ms': timers.groupby('configuration')['jitter_change_ms'].mean(),
+    }))
+    return callbacks, overhead.reset_index()
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Measure the tracing overhead of the system for different tracing configurations, see README.')
+    parser.add_argument(
+        '--configurations', type=lambda names: names.split(','), default=configurations,
+        help=f"comma-separated tracing configurations (default: {','.join(configurations)})")
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='number of runs of every configuration (default: %(default)s)')
+    parser.add_argument(
+        '--length', type=float, default=30.0,
+        help='length of execution (s) of every run (default: %(default)s)')
+    parser.add_argument(
+        '--runs', default='overhead_runs.csv',
+        help='path of the table of runs, written after running the system and read with --analyze-only '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--analyze-only', action='store_true',
+        help='do not run the system, only analyze the runs from the table of runs')
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='do not read or write the cache of processed trace data')
+    parser.add_argument(
+        '--output', default='overhead.csv',
+        help='path of the overhead table; the callback metrics are written next to it, with a _callbacks suffix '
+             '(default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main(argv=sys.argv[1:]) -> int:
+    """Run the system with every tracing configuration and compare results."""
+    args = parse_args(argv)
+    unknown = set(args.configurations) - set(configurations)
+    if unknown:
+        print(f"Unknown tracing configurations: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 1
+    if args.analyze_only:
+        runs = pd.read_csv(args.runs)
+    else:
+        runs = run_configurations(args.configurations, args.repeat, args.length)
+        runs.to_csv(args.runs, index=False)
+    callbacks, overhead = compare_configurations(runs, not args.no_cache)
+    root, ext = os.path.splitext(args.output)
+    callbacks_path = f'{root}_callbacks{ext}'
+    callbacks.to_csv(callbacks_path, index=False)
+    overhead.to_csv(args.output, index=False)
+    print(overhead.to_string(index=False))
+    print(f'Results: {args.output}, {callbacks_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
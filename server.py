@@ -0,0 +1,414 @@
+# Copyright 2021 Christophe Bedard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local server answering analysis queries on traces kept in memory, see README."""
+
+import argparse
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import io
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import pandas as pd
+
+import analyze
+
+
+# Factor applied to the size of the tables of a trace to account for the indexes built from them
+index_memory_factor = 2
+plot_formats = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+}
+
+# Plots use the global state of pyplot, so they are made one at a time
+plot_lock = threading.Lock()
+Result = Tuple[str, bytes]
+
+
+class QueryError(Exception):
+    """Error caused by a query, with the corresponding HTTP status."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class CachedTrace:
+    """Trace session in the cache, with the results of the queries made on it."""
+
+    def __init__(self) -> None:
+        self.session = None
+        self.memory = 0
+        # (query, params) -> result
+        self.results = {}
+        # Held while loading the trace, so that it is only loaded once
+        self.lock = threading.Lock()
+
+
+class TraceCache:
+    """
+    LRU cache of trace sessions and query results.
+
+    Traces are loaded when first queried. When the estimated memory of the cached traces, including their
+    query results, goes over the memory limit, the least recently used traces are evicted, except for
+    the most recently used one.
+    """
+
+    def __init__(self, root: str, memory_limit: int, use_cache: bool = True) -> None:
+        """
+        Create cache.
+
+        :param root: the path to the directory under which traces can be queried
+        :param memory_limit: the memory limit (bytes)
+        :param use_cache: whether to use the on-disk cache for processed data, see `analyze.load_data_model()`
+        """
+        self.root = os.path.realpath(root)
+        self.memory_limit = memory_limit
+        self.use_cache = use_cache
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+
+    def get_trace_dir(self, trace: str) -> str:
+        """Get the path to the directory of a trace given relative to the root directory."""
+        trace_dir = os.path.realpath(os.path.join(self.root, trace))
+        if os.path.commonpath([self.root, trace_dir]) != self.root:
+            raise QueryError(403, f'trace outside of root directory: {trace}')
+        if not os.path.isdir(os.path.join(trace_dir, 'ust')):
+            raise QueryError(404, f'trace not found: {trace}')
+        return trace_dir
+
+    def get(self, trace: str) -> CachedTrace:
+        """
+        Get trace from the cache, loading it if needed.
+
+        :param trace: the path to the directory containing the trace, relative to the root directory
+        :return: the cached trace
+        """
+        trace_dir = self.get_trace_dir(trace)
+        with self._lock:
+            cached = self._traces.get(trace_dir)
+            if cached is None:
+                cached = CachedTrace()
+                self._traces[trace_dir] = cached
+            self._traces.move_to_end(trace_dir)
+        with cached.lock:
+            if cached.session is None:
+                start = time.perf_counter()
+                cached.session = analyze.TraceSession.load(trace_dir, self.use_cache)
+                memory = index_memory_factor * get_data_model_memory(cached.session.data_util.data)
+                print(f'Loaded trace {trace_dir} ({memory / 1e6:.1f} MB) in {time.perf_counter() - start:.3f} s')
+                with self._lock:
+                    cached.memory += memory
+                    self._evict()
+        return cached
+
+    def add_result(self, cached: CachedTrace, key: Tuple, result: Result) -> None:
+        """Memoize query result for a cached trace."""
+        with self._lock:
+            if key not in cached.results:
+                cached.results[key] = result
+                cached.memory += len(result[1])
+                self._evict()
+
+    def get_status(self) -> List[Dict]:
+        """Get the cached traces, from least to most recently used, with their memory and number of results."""
+        with self._lock:
+            return [
+                {
+                    'trace': os.path.relpath(trace_dir, self.root),
+                    'memory_mb': cached.memory / 1e6,
+                    'results': len(cached.results),
+                }
+                for trace_dir, cached in self._traces.items()
+            ]
+
+    def _evict(self) -> None:
+        memory = sum(cached.memory for cached in self._traces.values())
+        while memory > self.memory_limit and 1 < len(self._traces):
+            trace_dir, cached = self._traces.popitem(last=False)
+            memory -= cached.memory
+            print(f'Evicted trace {trace_dir} ({cached.memory / 1e6:.1f} MB)')
+
+
+def get_data_model_memory(data: analyze.Ros2DataModel) -> int:
+    """Get the memory (bytes) used by the tables of a data model."""
+    return sum(
+        int(df.memory_usage(index=True, deep=True).sum())
+        for df in vars(data).values()
+        if isinstance(df, pd.DataFrame)
+    )
+
+
+def get_param(params: Dict[str, str], name: str, default: Optional[str] = None) -> str:
+    """Get query parameter, which is required if there is no default value."""
+    value = params.get(name, default)
+    if value is None:
+        raise QueryError(400, f'missing parameter: {name}')
+    return value
+
+
+def get_int_param(params: Dict[str, str], name: str) -> Optional[int]:
+    """Get optional integer query parameter, e.g., a timestamp (ns)."""
+    value = params.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        raise QueryError(400, f'invalid parameter: {name}={value}')
+
+
+def to_json(value) -> Result:
+    """Encode result as JSON, with DataFrames as lists of records."""
+    if isinstance(value, pd.DataFrame):
+        return 'application/json', value.to_json(orient='records').encode()
+
+    def default(value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        # NumPy scalars
+        return value.item()
+
+    return 'application/json', json.dumps(value, default=default).encode()
+
+
+def ranges_to_dict(ranges: analyze.TimeRanges) -> Dict[str, np.ndarray]:
+    """Get time ranges as a dict of begin, end, and duration (ns) arrays."""
+    return {'begins': ranges.begins, 'ends': ranges.ends, 'durations': ranges.durations}
+
+
+def query_nodes(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Get the names of all nodes."""
+    return to_json(session.get_node_names())
+
+
+def query_objects(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Get the owner node and topic of every callback object and publisher handle."""
+    return to_json(session.get_object_owners())
+
+
+def query_callback_ranges(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Get the instance ranges of the callbacks of a node, optionally beginning in the [start, end) time range."""
+    kind = get_param(params, 'kind', 'timer')
+    callback_objects = session.get_callback_objects(kind, get_param(params, 'node'), params.get('topic'))
+    start = get_int_param(params, 'start')
+    end = get_int_param(params, 'end')
+    return to_json({
+        str(callback_object): ranges_to_dict(session.get_callback_ranges(callback_object, start, end))
+        for callback_object in callback_objects
+    })
+
+
+def query_publish_times(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Get the publication timestamps of a topic, optionally in the [start, end) time range."""
+    return to_json(session.get_publish_times(
+        get_param(params, 'topic'), get_int_param(params, 'start'), get_int_param(params, 'end')))
+
+
+def query_interval_stats(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Get the period and duration summary of every callback, optionally of a node only."""
+    value = get_param(params, 'percentiles', '50,90,99')
+    try:
+        percentiles = [float(p) for p in value.split(',')]
+    except ValueError:
+        raise QueryError(400, f'invalid parameter: percentiles={value}')
+    if not all(0.0 <= p <= 100.0 for p in percentiles):
+        raise QueryError(400, f'percentiles must be between 0 and 100: {value}')
+    summary = analyze.get_callback_summary(session, percentiles)
+    node_name = params.get('node')
+    if node_name is not None:
+        if not node_name.startswith('/'):
+            node_name = '/' + node_name
+        summary = summary.loc[summary['node'] == node_name]
+    return to_json(summary)
+
+
+def query_chains(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Get the end-to-end latency summary of all chains."""
+    return to_json(analyze.get_chain_summary(session, analyze.get_chains(session)))
+
+
+def query_plot(session: analyze.TraceSession, params: Dict[str, str]) -> Result:
+    """Plot the timer callback interval & duration, optionally decimated, or the time chart of a node with 1 timer."""
+    plot = get_param(params, 'plot', 'timer')
+    plot_format = get_param(params, 'format', 'png')
+    max_points = get_int_param(params, 'points')
+    if plot_format not in plot_formats:
+        raise QueryError(400, f'unknown plot format: {plot_format}')
+    node_name = get_param(params, 'node')
+    timings = session.get_node_timings([node_name])
+    (node_timings,) = timings.values()
+    if 1 != len(node_timings.timers):
+        raise QueryError(400, f"node '{node_timings.name}' has {len(node_timings.timers)} timers (need exactly 1)")
+    (ranges_timer,) = node_timings.timers.values()
+    if 2 > len(ranges_timer):
+        raise QueryError(400, f"node '{node_timings.name}' has fewer than 2 timer callback instances")
+
+    import matplotlib.pyplot as plt
+    with plot_lock:
+        if 'timer' == plot:
+            fig = analyze.plot_timer(ranges_timer, None, max_points=max_points)
+        elif 'time_chart' == plot:
+            fig = analyze.plot_chart(
+                [ranges.begins for ranges in node_timings.subscriptions.values()],
+                ranges_timer,
+                list(node_timings.publishers.values()),
+                None,
+            )
+        else:
+            raise QueryError(400, f'unknown plot: {plot}')
+        buffer = io.BytesIO()
+        try:
+            fig.savefig(buffer, format=plot_format)
+        finally:
+            plt.close(fig)
+    return plot_formats[plot_format], buffer.getvalue()
+
+
+queries: Dict[str, Callable[[analyze.TraceSession, Dict[str, str]], Result]] = {
+    '/nodes': query_nodes,
+    '/objects': query_objects,
+    '/callback_ranges': query_callback_ranges,
+    '/publish_times': query_publish_times,
+    '/interval_stats': query_interval_stats,
+    '/chains': query_chains,
+    '/plot': query_plot,
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Handler of analysis queries.
+
+    Queries are GET requests, e.g., `/interval_stats?trace=system-YYYYMMDDTHHMMSS&node=/BehaviorPlanner`.
+    Every query on a trace takes the trace directory (relative to the root directory) as the `trace`
+    parameter, and its result is memoized. `/traces` gives the status of the cache.
+    """
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            if '/traces' == url.path:
+                result = to_json(self.server.traces.get_status())
+            elif url.path in queries:
+                cached = self.server.traces.get(get_param(params, 'trace'))
+                key = (url.path, tuple(sorted(params.items())))
+                result = cached.results.get(key)
+                if result is None:
+                    result = queries[url.path](cached.session, params)
+                    self.server.traces.add_result(cached, key, result)
+            else:
+                raise QueryError(404, f'unknown query: {url.path}')
+        except QueryError as e:
+            self.send_error(e.status, str(e))
+            return
+        except AssertionError as e:
+            # Invalid node names, topic names, etc.
+            self.send_error(400, str(e) or 'invalid query')
+            return
+        except Exception as e:
+            self.send_error(500, f'{type(e).__name__}: {e}')
+            return
+        content_type, body = result
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Query-Time-Ms', f'{(time.perf_counter() - start) * 1e3:.3f}')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Clients of Unix sockets do not have an address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket, handling every request in a thread."""
+
+    daemon_threads = True
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Answer analysis queries on traces kept in memory over HTTP, see README.')
+    parser.add_argument(
+        '--root', default='.',
+        help='directory under which traces can be queried (default: current directory)')
+    parser.add_argument(
+        '--host', default='localhost',
+        help='host to listen on (default: %(default)s)')
+    parser.add_argument(
+        '--port', type=int, default=8000,
+        help='port to listen on (default: %(default)s)')
+    parser.add_argument(
+        '--socket', metavar='PATH',
+        help='listen on a Unix socket instead of a TCP port')
+    parser.add_argument(
+        '--memory-limit', metavar='GB', type=float,
+        help='memory limit for cached traces and query results (default: available memory)')
+    parser.add_argument(
+        '--no-cache', dest='use_cache', action='store_false',
+        help='process traces even if cached data is available, and do not cache them (default: use cache)')
+    return parser.parse_args(argv)
+
+
+def main(argv=sys.argv[1:]) -> int:
+    """Run server until interrupted."""
+    args = parse_args(argv)
+    memory_limit = int(args.memory_limit * 1e9) if args.memory_limit is not None else analyze.get_available_memory()
+    # Plots are only rendered to images
+    os.environ['MPLBACKEND'] = 'agg'
+    if args.socket is not None:
+        # Remove socket left by a previous run
+        if os.path.exists(args.socket) and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, QueryHandler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+        address = f'http://{args.host}:{args.port}'
+    server.traces = TraceCache(args.root, memory_limit, args.use_cache)
+    print(f'Serving traces under {server.traces.root} on {address} ({memory_limit / 1e9:.1f} GB memory limit)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket is not None:
+            os.remove(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,56 +19,111 @@ import launch_ros
 from tracetools_launch.action import Trace
 
 
+# Kernel events of the full tracing configuration
+events_kernel = [
+    'sched_switch',
+    'sched_waking',
+    'sched_pi_setprio',
+    'sched_process_fork',
+    'sched_process_exit',
+    'sched_process_free',
+    'sched_wakeup',
+    'irq_softirq_entry',
+    'irq_softirq_raise',
+    'irq_softirq_exit',
+    'irq_handler_entry',
+    'irq_handler_exit',
+    'lttng_statedump_process_state',
+    'lttng_statedump_start',
+    'lttng_statedump_end',
+    'lttng_statedump_network_interface',
+    'lttng_statedump_block_device',
+    'block_rq_complete',
+    'block_rq_insert',
+    'block_rq_issue',
+    'block_bio_frontmerge',
+    'sched_migrate',
+    'sched_migrate_task',
+    'power_cpu_frequency',
+    'net_dev_queue',
+    'netif_receive_skb',
+    'net_if_receive_skb',
+    'timer_hrtimer_start',
+    'timer_hrtimer_cancel',
+    'timer_hrtimer_expire_entry',
+    'timer_hrtimer_expire_exit',
+]
+# Tracing configurations, as (UST events, kernel events), or None for no tracing
+tracing_configurations = {
+    'none': None,
+    # Minimal: only the events needed to get callback durations and timer periods
+    'callbacks': (
+        [
+            'ros2:rcl_init',
+            'ros2:rcl_node_init',
+            'ros2:rcl_publisher_init',
+            'ros2:rcl_subscription_init',
+            'ros2:rclcpp_subscription_init',
+            'ros2:rclcpp_subscription_callback_added',
+            'ros2:rcl_timer_init',
+            'ros2:rclcpp_timer_callback_added',
+            'ros2:rclcpp_timer_link_node',
+            'ros2:rclcpp_callback_register',
+            'ros2:callback_start',
+            'ros2:callback_end',
+        ],
+        [],
+    ),
+    'ust': (['ros2:*'], []),
+    'ust_sched': (
+        ['ros2:*'],
+        [event for event in events_kernel if event.startswith(('sched_', 'lttng_statedump_'))],
+    ),
+    'kernel': (['ros2:*'], events_kernel),
+}
+
+
+def generate_trace(context):
+    tracing = launch.substitutions.LaunchConfiguration('tracing').perform(context)
+    if tracing not in tracing_configurations:
+        raise ValueError(
+            f"unknown tracing configuration '{tracing}', choose from: {', '.join(tracing_configurations)}")
+    if tracing_configurations[tracing] is None:
+        return []
+    ust_events, kernel_events = tracing_configurations[tracing]
+    return [
+        Trace(
+            session_name=launch.substitutions.LaunchConfiguration('session_name').perform(context),
+            append_timestamp=True,
+            base_path=os.path.dirname(os.path.realpath(__file__)),
+            events_ust=ust_events,
+            events_kernel=kernel_events,
+        ),
+    ]
+
+
 def generate_launch_description():
     length_arg = launch.actions.DeclareLaunchArgument(
         'length',
         default_value='30.0',
         description='length of execution in seconds',
     )
+    tracing_arg = launch.actions.DeclareLaunchArgument(
+        'tracing',
+        default_value='kernel',
+        description=f"tracing configuration: {', '.join(tracing_configurations)}",
+    )
+    session_name_arg = launch.actions.DeclareLaunchArgument(
+        'session_name',
+        default_value='system',
+        description='name of the tracing session, used as the prefix of the trace directory',
+    )
 
     return launch.LaunchDescription([
         length_arg,
-        Trace(
-            session_name='system',
-            append_timestamp=True,
-            base_path=os.path.dirname(os.path.realpath(__file__)),
-            events_ust=[
-                'ros2:*',
-            ],
-            events_kernel=[
-                'sched_switch',
-                'sched_waking',
-                'sched_pi_setprio',
-                'sched_process_fork',
-                'sched_process_exit',
-                'sched_process_free',
-                'sched_wakeup',
-                'irq_softirq_entry',
-                'irq_softirq_raise',
-                'irq_softirq_exit',
-                'irq_handler_entry',
-                'irq_handler_exit',
-                'lttng_statedump_process_state',
-                'lttng_statedump_start',
-                'lttng_statedump_end',
-                'lttng_statedump_network_interface',
-                'lttng_statedump_block_device',
-                'block_rq_complete',
-                'block_rq_insert',
-                'block_rq_issue',
-                'block_bio_frontmerge',
-                'sched_migrate',
-                'sched_migrate_task',
-                'power_cpu_frequency',
-                'net_dev_queue',
-                'netif_receive_skb',
-                'net_if_receive_skb',
-                'timer_hrtimer_start',
-                'timer_hrtimer_cancel',
-                'timer_hrtimer_expire_entry',
-                'timer_hrtimer_expire_exit',
-            ],
-        ),
+        tracing_arg,
+        session_name_arg,
+        launch.actions.OpaqueFunction(function=generate_trace),
         launch_ros.actions.Node(
             package='autoware_reference_system',
             executable='autoware_default_multithreaded',
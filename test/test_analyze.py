@@ -0,0 +1,257 @@
+# Copyright 2021 Christophe Bedard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of the vectorized analysis steps against straightforward implementations."""
+
+from typing import Dict
+from typing import List
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+import analyze
+import benchmark
+
+
+@pytest.fixture(scope='module')
+def data_model() -> analyze.Ros2DataModel:
+    return benchmark.generate_data_model(10_000)
+
+
+def is_memory_mapped(values: np.ndarray) -> bool:
+    """Check if an array is a view of a memory-mapped array."""
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def test_cache_round_trip(tmp_path) -> None:
+    data = benchmark.generate_data_model(1_000)
+    # Column of Python objects, which is pickled
+    data.nodes['parameters'] = [{'rate': i} for i in range(len(data.nodes))]
+    # Empty table, with an index, like the tables of a trace without these events
+    data.services = pd.DataFrame(
+        columns=['service_handle', 'timestamp', 'node_handle', 'rmw_handle', 'service_name'],
+    ).set_index(['service_handle'])
+    cache_dir = str(tmp_path)
+    analyze.write_cache(cache_dir, 'key', data)
+
+    cached = analyze.read_cache(cache_dir, 'key')
+    assert cached is not None
+    tables = {name: df for name, df in vars(data).items() if isinstance(df, pd.DataFrame)}
+    assert 'services' in tables
+    for name, df in tables.items():
+        cached_df = getattr(cached, name)
+        for column in df.columns:
+            values = cached_df[column].to_numpy()
+            if not values.dtype.hasobject:
+                assert is_memory_mapped(values), f'{name}.{column}'
+        # Copy, since the memory-mapped arrays are not of the same class
+        pd.testing.assert_frame_equal(cached_df.copy(), df)
+    assert isinstance(cached.nodes['parameters'].iloc[1], dict)
+
+    assert analyze.read_cache(cache_dir, 'other key') is None
+    assert analyze.read_cache(str(tmp_path / 'missing'), 'key') is None
+
+
+def scan_publish_instances(
+    rclcpp_instances: pd.DataFrame,
+    rcl_instances: pd.DataFrame,
+    rmw_instances: pd.DataFrame,
+) -> Dict[int, List[int]]:
+    """Match publish instances row by row, like the analysis did before `match_publish_instances()`."""
+    pub_instances = pd.concat([
+        rclcpp_instances.assign(layer=0, publisher_handle=0),
+        rcl_instances.assign(layer=1),
+        rmw_instances.assign(layer=2),
+    ]).sort_values(['timestamp', 'layer'], kind='stable', ignore_index=True)
+    timestamps = pub_instances['timestamp'].tolist()
+    messages = pub_instances['message'].tolist()
+    layers = pub_instances['layer'].tolist()
+    pub_times = {}
+    for index, handle in enumerate(pub_instances['publisher_handle'].tolist()):
+        if 1 != layers[index]:
+            continue
+        # Closest rclcpp_publish row above and rmw_publish row below with the same message
+        rclcpp_index = index - 1
+        while not (messages[index] == messages[rclcpp_index] and 0 == layers[rclcpp_index]):
+            rclcpp_index -= 1
+        rmw_index = index + 1
+        while not (messages[index] == messages[rmw_index] and 2 == layers[rmw_index]):
+            rmw_index += 1
+        rclcpp_timestamp = timestamps[rclcpp_index]
+        rmw_timestamp = timestamps[rmw_index]
+        pub_times.setdefault(handle, []).append(rclcpp_timestamp + (rmw_timestamp - rclcpp_timestamp) // 2)
+    return pub_times
+
+
+def generate_interleaved_publish_instances(num_publishes: int, seed: int = 0) -> List[pd.DataFrame]:
+    """Generate publish instances of a few publishers that overlap in time and reuse message pointers."""
+    rng = np.random.default_rng(seed)
+    starts = np.arange(num_publishes) * 10 + rng.integers(0, 5, num_publishes)
+    rclcpp_times = starts
+    rcl_times = rclcpp_times + rng.integers(0, 10, num_publishes)
+    rmw_times = rcl_times + rng.integers(0, 10, num_publishes)
+    # Pointers are reused, but not by publishes that are in progress at the same time
+    messages = 0x1000 + np.arange(num_publishes) % 8
+    handles = rng.choice([0x2001, 0x2002, 0x2003], num_publishes)
+    return [
+        pd.DataFrame({'timestamp': rclcpp_times, 'message': messages}).sample(frac=1.0, random_state=seed),
+        pd.DataFrame({'timestamp': rcl_times, 'publisher_handle': handles, 'message': messages}),
+        pd.DataFrame({'timestamp': rmw_times, 'message': messages}),
+    ]
+
+
+def check_publish_instances(rclcpp_instances, rcl_instances, rmw_instances) -> None:
+    store = analyze.match_publish_instances(rclcpp_instances, rcl_instances, rmw_instances)
+    expected = scan_publish_instances(rclcpp_instances, rcl_instances, rmw_instances)
+    assert sorted(store.get_keys()) == sorted(expected)
+    for handle, pub_times in expected.items():
+        assert store.get(handle).tolist() == sorted(pub_times)
+
+
+def test_match_publish_instances_interleaved() -> None:
+    check_publish_instances(*generate_interleaved_publish_instances(9_000))
+
+
+def test_match_publish_instances(data_model) -> None:
+    check_publish_instances(
+        data_model.rclcpp_publish_instances, data_model.rcl_publish_instances, data_model.rmw_publish_instances)
+
+
+def scan_timer_period(time: int, timer_begins: List[int], pre: bool) -> int:
+    """Get the timer period of a timestamp with a linear scan, like the time chart colours used to."""
+    for i, begin in enumerate(timer_begins):
+        if pre and time <= begin and (0 == i or time > timer_begins[i - 1]):
+            return i
+        if not pre and time >= begin and (len(timer_begins) - 1 == i or time < timer_begins[i + 1]):
+            return i
+    return -1
+
+
+@pytest.mark.parametrize('pre', [True, False])
+def test_get_timer_periods(pre) -> None:
+    timer_begins = np.array([100, 200, 300, 400])
+    # Before the first begin, at every begin, between begins, and after the last begin
+    times = np.array([0, 99, 100, 101, 150, 199, 200, 300, 399, 400, 401, 1000])
+    expected = [scan_timer_period(time, timer_begins.tolist(), pre) for time in times]
+    assert analyze.get_timer_periods(times, timer_begins, pre).tolist() == expected
+    assert [] == analyze.get_timer_periods(np.array([], dtype=np.int64), timer_begins, pre).tolist()
+    assert [-1, -1] == analyze.get_timer_periods(np.array([0, 10]), np.array([], dtype=np.int64), pre).tolist()
+
+
+def test_get_concurrency_windows() -> None:
+    # Levels: 1 on [0, 10), 2 on [10, 15), 1 on [15, 30), 0 on [30, 35), 1 on [35, 40)
+    times, levels = analyze.get_concurrency(np.array([0, 10, 35]), np.array([15, 30, 40]))
+    windows = analyze.get_concurrency_windows(times, levels, 20)
+    assert windows['window_start'].tolist() == [0, 20]
+    assert windows['mean_level'].tolist() == pytest.approx([25 / 20, 15 / 20])
+    assert windows['max_level'].tolist() == [2, 1]
+    # The last window ends with the last interval instead of being diluted over the full window duration
+    windows = analyze.get_concurrency_windows(times, levels, 30)
+    assert windows['mean_level'].tolist() == pytest.approx([35 / 30, 5 / 10])
+    assert windows['max_level'].tolist() == [2, 1]
+    # A single window
+    windows = analyze.get_concurrency_windows(times, levels, 100)
+    assert windows['mean_level'].tolist() == pytest.approx([40 / 40])
+    assert windows['max_level'].tolist() == [2]
+    # No callback instances
+    times, levels = analyze.get_concurrency(np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+    assert analyze.get_concurrency_windows(times, levels, 20).empty
+
+
+def test_quantile_sketch() -> None:
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(14.0, 1.0, 10_000)
+    sketch = analyze.QuantileSketch(0.01)
+    assert np.isnan(sketch.get_percentile(50.0))
+    sketch.add_values(values)
+    for percentile in (0.0, 50.0, 90.0, 99.0, 99.9):
+        expected = np.percentile(values, percentile, method='lower')
+        assert sketch.get_percentile(percentile) == pytest.approx(expected, rel=0.01)
+    assert sketch.get_percentile(100.0) == values.max()
+
+    # Merging gives the same sketch as adding all values, one at a time or at once
+    first = analyze.QuantileSketch(0.01)
+    second = analyze.QuantileSketch(0.01)
+    for value in values[:5_000]:
+        first.add(value)
+    second.add_values(values[5_000:])
+    first.merge(second)
+    assert first.count == sketch.count
+    assert first.counts.tolist() == sketch.counts.tolist()
+    assert (first.min, first.max) == (sketch.min, sketch.max)
+
+    # Values below 1 are counted as 1, and percentiles stay within the minimum and maximum
+    small = analyze.QuantileSketch(0.01)
+    small.add_values(np.array([0.0, 0.5]))
+    assert 0.0 <= small.get_percentile(0.0) <= 0.5
+    assert small.get_percentile(100.0) == 0.5
+
+
+def test_get_state_time_until() -> None:
+    starts = np.array([0, 15, 33])
+    ends = np.array([10, 20, 40])
+    # Before the first interval, in, between, and after intervals
+    times = np.array([-1, 0, 5, 12, 17, 35, 50])
+    assert analyze.get_state_time_until(starts, ends, times).tolist() == [0, 0, 5, 10, 12, 17, 22]
+
+
+def test_get_callback_kernel_stats() -> None:
+    data = benchmark.generate_data_model(1_000)
+    # Callback instances [5, 35) and [36, 38) of thread 1, and 1 instance of thread 2 without kernel data
+    data.callback_instances = pd.DataFrame({
+        'callback_object': [1, 1, 2],
+        'timestamp': [5, 36, 40],
+        'duration': [30, 2, 10],
+        'tid': [1, 1, 2],
+    })
+    intervals = pd.DataFrame({
+        'tid': [1, 1, 1, 1, 1, 1, 1],
+        'start': [0, 10, 15, 20, 30, 33, 40],
+        'end': [10, 15, 20, 30, 33, 40, 100],
+        'state': np.array([
+            analyze.thread_running,
+            analyze.thread_preempted,
+            analyze.thread_running,
+            analyze.thread_blocked,
+            analyze.thread_wakeup,
+            analyze.thread_running,
+            analyze.thread_blocked,
+        ], dtype=np.int8),
+        'cpu': [0, -1, 1, -1, -1, 0, -1],
+    })
+    stats = analyze.get_callback_kernel_stats(analyze.TraceSession('', data), intervals)
+    assert stats['on_cpu'].tolist()[:2] == [12, 2]
+    assert stats['preempted'].tolist()[:2] == [5, 0]
+    assert stats['wakeup_latency'].tolist()[:2] == [3, 0]
+    assert stats['blocked'].tolist()[:2] == [10, 0]
+    # Wakeup latency of the last wakeup before the callback instance
+    assert stats['prior_wakeup_latency'].tolist()[:2] == [0, 3]
+    columns = ['on_cpu', 'preempted', 'wakeup_latency', 'blocked', 'prior_wakeup_latency']
+    assert stats.loc[2, columns].isna().all()
+
+
+def test_get_fifo_indexes() -> None:
+    # The second callback instance has no message to take, and the third takes the second message
+    assert analyze.get_fifo_indexes(np.array([5, 6, 25]), np.array([0, 10, 20])).tolist() == [0, -1, 1]
+    # Messages are taken in order, even when several were published before a callback instance
+    assert analyze.get_fifo_indexes(np.array([25, 26, 27, 28]), np.array([0, 10, 20])).tolist() == [0, 1, 2, -1]
+    assert [] == analyze.get_fifo_indexes(np.array([], dtype=np.int64), np.array([0, 10])).tolist()
+    assert [-1, -1] == analyze.get_fifo_indexes(np.array([5, 6]), np.array([], dtype=np.int64)).tolist()